@@ -5,13 +5,15 @@ import os
 import subprocess
 import sys
 import functools
-import threading
-import time
 
 import take_data
 import path
+import audio_cache
 import main
 import record
+import schedule
+import daily_plan
+import download
 import settings
 import pronounce
 
@@ -26,6 +28,9 @@ logging.basicConfig(level=logging.INFO,
                     filename='add_word.log',  # 日志文件名为 app.log
                     filemode='a')  # 追加模式写入日志
 
+# 学习时从当前卡片起向后预读的卡片数，提前批量查询文本、下载发音
+LOOKAHEAD = 20
+
 
 class ActionsCategory:
     StudyMode = 'StudyMode'
@@ -135,6 +140,8 @@ class InitUI:
                                             f"数据：{self.father.selected_2_data_sources_type} "
                                             f"模式：{self.father.selected_3_word_mode}")
                 self.father.display_label.setText(self.father.display_text)
+                # 选择变化后在后台重新准备下一轮学习
+                self.father.prefetch_session()
 
             def handle_input_change():
                 """
@@ -147,6 +154,7 @@ class InitUI:
                     num = float(text)
                     if num > 0:
                         print(f"输入的有效数字为: {num}")
+                        self.father.prefetch_session()
                     else:
                         print("输入的数字应大于0，请重新输入")
                 except ValueError:
@@ -374,53 +382,32 @@ class InitUI:
         """
         初始化今日学习数据
 
-        检查上次运行日期，若为首次今日运行则：
-        1. 清理临时文件
-        2. 获取今日新词和昨日复习词
-        3. 启动MP3下载线程
-        4. 更新最后运行日期记录
+        读取当天的每日计划，今日首次运行时生成计划（今日新词和昨日复习词）；
+        计划中发音尚未下载好的单词在后台补充下载
         """
-        # 获取当前日期
-        today = datetime.date.today()
+        plan = daily_plan.DailyPlan.for_today(self.father.recorder, datetime.date.today())
 
-        # 检查记录文件是否存在
-        if os.path.exists(path.last_run_date):
-            # 读取文件中的日期
-            with open(path.last_run_date, 'r') as f:
-                last_run_date_str = f.read().strip()
-                try:
-                    # 将字符串转换为日期对象
-                    last_run_date = datetime.datetime.strptime(last_run_date_str, '%Y-%m-%d').date()
-                    # 如果上次运行日期是今天，不执行主要逻辑
-                    if last_run_date == today:
-                        print("今天已经运行过，不再执行。")
-                        return
-                except ValueError:
-                    # 处理日期格式错误的情况
-                    pass
-        else:
-            with open(path.last_run_date, 'r'):
-                pass
-
-        # 执行主要逻辑
-        print("正在执行主要逻辑...")
-        # 这里可以放你需要每天只运行一次的代码
-        self.father.memorize_word.clear(path.today_mp3)
-
-        today_data = main.Main(main.StudyMode.New_Learning, 15, main.DataSourcesType.NotLearnedYet,
-                               study_mode=record.RecordType.TodayData).data
-        yesterday_data = self.father.recorder.get(record.RecordType.LearnedAlready, today - datetime.timedelta(days=1))
-        down_load_thread_1_today = threading.Thread(target=self.father.down_load_mp3,
-                                                    args=(today_data, path.today_mp3,))
-        down_load_thread_1_today.start()
-        down_load_thread_2_yesterday = threading.Thread(target=self.father.down_load_mp3,
-                                                        args=(yesterday_data, path.yesterday_mp3,))
-        down_load_thread_2_yesterday.start()
-        self.father.recorder.write(record.RecordType.TodayData, datetime.date.today(), today_data)
-
-        # 更新记录文件中的日期
-        with open(path.last_run_date, 'w') as f:
-            f.write(str(today))
+        # 新词和复习词中发音还没有下载好的单词作为一个批次交给下载引擎
+        missing = {}
+        words = []
+        for kind in (daily_plan.NEW, daily_plan.REVIEW):
+            positions = plan.missing_audio(kind)
+            word_list, = self.father.word_manager.get_data_by_indices([plan.words[kind][i] for i in positions],
+                                                                      ("word",))
+            missing[kind] = [(position, word) for position, word in zip(positions, word_list) if word is not None]
+            words.extend(word for _, word in missing[kind])
+
+        def mark_audio_ready(batch):
+            # 两种口音都已经在缓存中的单词标记为下载好；有下载失败时下次启动只补充剩余的
+            for kind, items in missing.items():
+                for position, word in items:
+                    if self.father.memorize_word.is_cached(word):
+                        plan.set_audio_ready(kind, position)
+            plan.save()
+            print(f"每日计划的发音下载完成，失败 {len(batch.failed)} 个")
+
+        if words:
+            self.father.memorize_word.download(words, wait=False, callback=mark_audio_ready)
 
 
 # noinspection PyUnresolvedReferences
@@ -437,6 +424,8 @@ class StudyRun:
         self.now_using_word_length = None
         self.word_index = None
         self.running = None
+        # 本轮单词的 {单词索引: (单词, 释义)}，开始时批量查询一次
+        self.card_text = {}
         self.run()
 
     def change_index(self, boolean_value):
@@ -476,26 +465,33 @@ class StudyRun:
             :param label: 要设置文本的标签
             :return: 要显示的文本
             """
-            data = self.father.word_manager.get_data_by_index(self.running.data[index])
-            self.now_word = data.word
+            card = self.running.data.seek(index)
+            word, meaning = self.get_card_text(card.word_index)
+            self.now_word = word
+            if word is None:
+                # 单词索引超出范围，显示占位文本
+                word = meaning = "--------"
             # 先根据混合模式确定基础的文本选择
             if self.word_mode == main.WordMode.Mixed_Mode:
-                primary_text = data.word if self.running.random_table_0_and_1[index] == 0 else data.meaning
+                primary_text = word if card.reverse == 0 else meaning
             elif self.word_mode == main.WordMode.C_to_E:
-                primary_text = data.meaning
+                primary_text = meaning
             else:  # main.Word_Mode.E_to_C
-                primary_text = data.word
+                primary_text = word
 
             # 根据标签确定最终要返回的文本
             if label == self.father.label_1:
                 return primary_text
             else:
                 # 若不是 label_1，则返回另一个值
-                return data.word if primary_text == data.meaning else data.meaning
+                return word if primary_text == meaning else meaning
 
         def update_labels():
-            self.word_index = self.running.index // 2
+            self.word_index = self.cursor
             print(self.running.index)
+            # 移动游标并批量查询接下来几张卡片的文本
+            self.running.data.seek(self.word_index)
+            self.load_card_text(self.running.data.peek(LOOKAHEAD))
             text_1 = get_text_based_on_mode(self.word_index, self.father.label_1)
             text_2 = get_text_based_on_mode(self.word_index, self.father.label_2)
             if self.running.index % 2 == 0:
@@ -508,12 +504,9 @@ class StudyRun:
                 self.father.label_2.setText(text_2)
 
             if self.father.action_pronunciation.isChecked():
-                if self.daily_tasks.daily_name is not None:
-                    if self.daily_tasks.daily_name == main.DailyTasks.study:
-                        self.father.memorize_word.sing(self.now_word, file_path=path.today_mp3)
-                    elif self.daily_tasks.daily_name == main.DailyTasks.review:
-                        self.father.memorize_word.sing(self.now_word, file_path=path.yesterday_mp3)
-                else:
+                # 按游标位置准备当前和接下来几张卡片的发音，每日任务和普通学习都从同一个缓存中读取
+                self.father.audio_prefetcher.update(self.upcoming_words(self.father.audio_prefetcher.lookahead))
+                if self.now_word is not None:
                     self.father.memorize_word.sing(self.now_word)
 
         self.now_using_word_length = len(self.running.data)
@@ -525,6 +518,39 @@ class StudyRun:
                                              self.data_source_type,
                                              self.word_mode))
 
+    @property
+    def cursor(self):
+        """
+        :return: 当前卡片的位置
+        """
+        return self.running.index // 2
+
+    def upcoming_words(self, count: int):
+        """
+        :param count: 卡片数
+        :return: 从游标开始（含当前卡片）的若干个单词，跳过索引超出范围的卡片
+        """
+        indices = self.running.data.peek(count)
+        self.load_card_text(indices)
+        return [self.card_text[index][0] for index in indices if self.card_text[index][0] is not None]
+
+    def load_card_text(self, indices):
+        """
+        批量查询一组单词的单词和释义，存入 card_text
+        :param indices: 单词索引列表
+        """
+        missing = [index for index in indices if index not in self.card_text]
+        words, meanings = self.father.word_manager.get_data_by_indices(missing)
+        self.card_text.update(zip(missing, zip(words, meanings)))
+
+    def get_card_text(self, index):
+        """
+        :return: (单词, 释义)，不在 card_text 中时补查一次；索引超出范围时为 (None, None)
+        """
+        if index not in self.card_text:
+            self.load_card_text([index])
+        return self.card_text[index]
+
     def reset_data(self):
         """
         重置学习状态
@@ -542,6 +568,11 @@ class StudyRun:
                                              self.word_mode))
         self.running = None
         self.word_index = 0
+        # 一轮学习结束，把本轮的保存/斩杀记录和调度数据写盘
+        self.father.recorder.flush()
+        self.father.scheduler.flush()
+        # 本轮的记录已经改变，按当前选择重新准备下一轮
+        self.father.prefetch_session()
         # keyboard.remove_all_hotkeys()
 
         for shortcut in self.father.shortcuts:
@@ -608,12 +639,17 @@ class StudyRun:
         """
         print(self.study_mode, self.data_source_type, self.word_mode)
 
-        self.running = main.Main(self.word_mode, self.now_using_word_length, self.data_source_type, self.study_mode, sp)
+        # 普通学习优先使用后台预先构建好的会话，没有可用的会话时再当场构建
+        self.running = None
+        if sp.daily_name is None:
+            self.running = self.father.prefetcher.take(self.word_mode, self.now_using_word_length,
+                                                       self.data_source_type, self.study_mode)
+        if self.running is None:
+            self.running = main.Main(self.word_mode, self.now_using_word_length, self.data_source_type,
+                                     self.study_mode, sp, recorder=self.father.recorder,
+                                     scheduler=self.father.scheduler)
 
         self.now_using_word_length = len(self.running.data)
-        if self.daily_tasks != main.DailyTasks.study:
-            if self.daily_tasks != main.DailyTasks.review:
-                self.father.down_load_mp3(self.running.data)
         self.print_text()
 
     def run(self, goon=None):
@@ -651,10 +687,28 @@ class UI:
         """
 
         self.shortcuts = []
-        self.recorder = record.Record()
-        self.settings = settings.Settings("settings.json")
-        self.memorize_word = pronounce.MemorizeWord()
+        self.settings = settings.Settings(path.settings_json)
+        self.recorder = record.Record(self.settings.get("record_backend", record.RecordBackend.Json))
+        self.scheduler = schedule.Scheduler.shared()
+        self.scheduler.retention = self.settings.get("desired_retention", schedule.DESIRED_RETENTION)
+        self.audio_cache = audio_cache.AudioCache(budget=self.settings.get("audio_cache_bytes",
+                                                                           audio_cache.DEFAULT_BUDGET))
+        if self.audio_cache.created:
+            # 第一次使用缓存时把旧的语音库和每日发音目录中已经下载好的文件导入进来
+            for directory in (path.Speech, path.today_mp3, path.yesterday_mp3):
+                self.audio_cache.import_directory(directory)
+            self.audio_cache.flush()
+        self.memorize_word = pronounce.MemorizeWord(download.Downloader.from_settings(self.settings),
+                                                    self.settings.get("pronounce_base_url", pronounce.DEFAULT_BASE_URL),
+                                                    self.audio_cache,
+                                                    pronounce.create_backend(
+                                                        self.settings.get("audio_backend", pronounce.BACKEND_PLAYSOUND),
+                                                        self.settings.get("pcm_cache_bytes",
+                                                                          pronounce.DEFAULT_PCM_BUDGET)))
+        self.audio_prefetcher = pronounce.AudioPrefetcher(self.memorize_word,
+                                                          self.settings.get("audio_lookahead", pronounce.DEFAULT_LOOKAHEAD))
         self.word_manager = take_data.WordListManager()
+        self.prefetcher = main.SessionPrefetcher(self.recorder, self.scheduler)
         self.running_manage = None
 
         self.action_pronunciation = None
@@ -678,26 +732,23 @@ class UI:
 
         self.display_label = QLabel(self.win)
         self.init_ui = InitUI(self)
+        self.prefetch_session()
 
         sys.exit(self.app.exec_())
 
-    def down_load_mp3(self, data, file_path=None):
+    def prefetch_session(self):
         """
-        异步下载单词发音MP3文件
-
-        :param data: 需要下载的单词数据列表
-        :param file_path: 文件保存路径，默认为None使用默认路径
+        按当前菜单选择和数量在后台预先构建下一轮学习，数量无效时跳过
         """
-
-        def down_loading(_data, _file_path=None):
-            word_list = []
-            for data_i in _data:
-                word_list.append(self.word_manager.get_data_by_index(data_i).word)
-            self.memorize_word.download(word_list, file_path=_file_path)
-
-        down_thread = threading.Thread(target=down_loading, args=(data, file_path,))
-        down_thread.start()
-        time.sleep(1.5)
+        if self.input_edit is None:
+            return
+        try:
+            number = int(self.input_edit.text())
+        except ValueError:
+            return
+        if number > 0:
+            self.prefetcher.request(self.selected_3_word_mode, number, self.selected_2_data_sources_type,
+                                    self.selected_1_study_mode)
 
     def turn_action(self, ac=False, _all=False, reset=False):
         """
@@ -770,6 +821,12 @@ class UI:
             max_value_length = max(len(value) if isinstance(value, list) else 1 for value in data_dict.values())
             # 生成表头，如果值是列表，会根据最大长度扩展表头
             extended_header = [header[0]] + [f"{header[1]}_{i + 1}" for i in range(max_value_length)]
+            # 一次批量查询出所有用到的单词和释义
+            all_indices = [num for value in data_dict.values()
+                           for num in (value if isinstance(value, list) else [value])]
+            words, meanings = self.word_manager.get_data_by_indices(all_indices)
+            contents = {num: f"{word}-{meaning}" if word is not None else f"#{num}"
+                        for num, word, meaning in zip(all_indices, words, meanings)}
 
             with open(self.temp_file_path, "w", newline="") as temp_file:
                 writer = csv.writer(temp_file)
@@ -779,11 +836,8 @@ class UI:
                     # 如果值不是列表，将其转换为包含一个元素的列表
                     if not isinstance(value, list):
                         value = [value]
-                    # 使用 get_data 函数获取列表元素的具体内容
-                    content_list = []
-                    for num in value:
-                        result = self.word_manager.get_data_by_index(num)
-                        content_list.append(f"{result.word}-{result.meaning}")
+                    # 从批量查询的结果中取出列表元素的具体内容
+                    content_list = [contents[num] for num in value]
                     # 补齐值列表的长度，使其达到最大长度
                     row = [key] + content_list + ['' for _ in range(max_value_length - len(content_list))]
                     writer.writerow(row)
@@ -830,8 +884,15 @@ class UI:
                 self.run(daily_tasks)"""
                 print("任务一结束")
             case "加练5个":
-                daily_tasks = main.DailyTasks.DailyTasksData(main.DailyTasks.review, 5)
-                self.run(daily_tasks)
+                # 正在学习时直接在本轮末尾追加，否则开始新的一轮
+                if self.running_manage is not None and self.running_manage.running is not None:
+                    added = self.running_manage.running.extend(5)
+                    print(f"本轮追加了 {added} 个单词")
+                    self.top_right_button.setText("重置")
+                    self.running_manage.print_text()
+                else:
+                    daily_tasks = main.DailyTasks.DailyTasksData(main.DailyTasks.review, 5)
+                    self.run(daily_tasks)
             case "添加今日单词":
                 # 创建一个对话框
                 dialog = QDialog(self.win)
@@ -863,9 +924,10 @@ class UI:
                     print("输入的单词：", words)
                     temp_word_list = words.split("\n")
                     for word in temp_word_list:
-                        index = self.word_manager.get_data_by_word(word)
-                        if index is not None:
-                            self.recorder.add(record.RecordType.LearnedAlready, datetime.date.today(), index)
+                        word_data = self.word_manager.get_data_by_word(word.strip())
+                        if word_data is not None:
+                            self.recorder.add(record.RecordType.LearnedAlready, datetime.date.today(),
+                                              word_data.index)
                         else:
                             logging.info("单词%s不在单词表" % word)  # 记录开始初始化今日数据的日志
                             print("单词%s不在单词表" % word)
@@ -879,12 +941,19 @@ class UI:
 
         功能：
         1. 保存发音设置
-        2. 清理临时语音文件
-        3. 持久化配置
+        2. 写入尚未落盘的学习记录
+        3. 保存发音缓存的索引
+        4. 持久化配置
         """
         print(event)
         self.settings.set("pronounce", self.action_pronunciation.isChecked())
-        self.memorize_word.clear(path.Speech)
+        self.recorder.close()
+        self.scheduler.flush()
+        self.audio_cache.flush()
+        average, worst, skipped = self.memorize_word.player.stats()
+        print(f"朗读延迟：平均 {average} ms，最长 {worst} ms，跳过过期的朗读 {skipped} 次")
+        decode, play = self.memorize_word.player.backend.stats()
+        print(f"播放后端 {self.memorize_word.player.backend.name}：平均解码 {decode} ms，平均播放 {play} ms")
         self.settings.save()
 
     def handle_button_click(self, text):
@@ -894,8 +963,8 @@ class UI:
         :param text: 按钮文本
         功能：
         - "提示"：朗读当前单词
-        - "保存"：记录到生词本
-        - "斩杀"：标记为已掌握
+        - "保存"：记录到生词本，并按没有记住重新调度
+        - "斩杀"：标记为已掌握，并按完全记住重新调度
         - "结束"：确认退出流程
         """
 
@@ -907,19 +976,23 @@ class UI:
                     self.memorize_word.sing(self.running_manage.now_word)
             case "保存":
                 if self.running_manage is not None:
-                    self.recorder.add(record.RecordType.Logbook, datetime.date.today(),
-                                      self.running_manage.running.data[self.running_manage.word_index])
+                    word_index = self.running_manage.running.data.seek(self.running_manage.word_index).word_index
+                    self.recorder.add(record.RecordType.Logbook, datetime.date.today(), word_index)
+                    self.scheduler.review(word_index, schedule.QUALITY_FORGOT)
             case "斩杀":
-                # 获取当前单词在数据列表中的实际索引
-                word_index = self.running_manage.running.index // 2
+                session = self.running_manage.running.data
+                # 获取当前单词对应的卡片
+                word_index = session.seek(self.running_manage.running.index // 2).word_index
                 # 记录到已掌握
-                self.recorder.add(record.RecordType.FullyMastered, datetime.date.today(),
-                                  self.running_manage.running.data[word_index])
-                # 移除对应的单词数据和随机表条目
-                self.running_manage.running.data.pop(word_index)
-                self.running_manage.running.random_table_0_and_1.pop(word_index)
+                self.recorder.add(record.RecordType.FullyMastered, datetime.date.today(), word_index)
+                self.scheduler.review(word_index, schedule.QUALITY_PERFECT)
+                # 从本轮中移除当前卡片
+                session.remove_current()
+                if len(session) == 0:
+                    self.running_manage.reset_data()
+                    return
                 # 调整当前索引，防止越界
-                max_index = len(self.running_manage.running.data) * 2 - 1
+                max_index = len(session) * 2 - 1
                 self.running_manage.running.index = min(self.running_manage.running.index, max_index)
 
                 # 刷新显示
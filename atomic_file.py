@@ -0,0 +1,68 @@
+"""
+以“临时文件 + 重命名”的方式原子地写文件：内容先写入目标文件同目录下的临时文件并 fsync，再用 os.replace 替换目标文件，
+读取方只会看到旧的或新的完整文件。记录、调度、每日计划、发音缓存和下载都通过这里写盘。
+"""
+import contextlib
+import os
+import stat
+import tempfile
+
+
+@contextlib.contextmanager
+def temp_file(file_path: str, binary: bool = False, sync: bool = True):
+    """
+    在目标文件同目录下创建临时文件，with 块正常结束后写盘并设置权限，出错时删除临时文件
+    :param file_path: 最终要替换的目标文件
+    :param binary: 是否以二进制方式打开
+    :param sync: 是否 fsync
+    :return: (文件对象, 临时文件路径)
+    """
+    directory = os.path.dirname(file_path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as file:
+            yield file, temp_path
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+        # mkstemp 创建的文件只有所有者可读写，这里沿用原文件的权限
+        os.chmod(temp_path, stat.S_IMODE(os.stat(file_path).st_mode) if os.path.exists(file_path) else 0o644)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_temp(content, file_path: str, sync: bool = True):
+    """
+    把内容写入目标文件同目录下的临时文件
+    :param content: 文本（str）或二进制（bytes）内容
+    :param file_path: 最终要替换的目标文件
+    :param sync: 是否 fsync
+    :return: 临时文件路径
+    """
+    with temp_file(file_path, isinstance(content, bytes), sync) as (file, temp_path):
+        file.write(content)
+    return temp_path
+
+
+def replace(temp_path: str, file_path: str):
+    """
+    用临时文件原子地替换目标文件，失败时删除临时文件
+    """
+    try:
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write(content, file_path: str, sync: bool = True):
+    """
+    原子地写入整个文件
+    :param content: 文本（str）或二进制（bytes）内容
+    :param file_path: 目标文件
+    :param sync: 是否 fsync
+    """
+    replace(write_temp(content, file_path, sync), file_path)
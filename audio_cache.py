@@ -0,0 +1,208 @@
+"""
+发音缓存：所有发音按 (单词, 口音) 保存在缓存目录的打包文件 audio.pack（见 audio_pack）中，
+语音库、今日和昨日的发音都从这里读取，退出程序和换日时不再清空。
+下载先落地为缓存目录中以 (单词, 口音) 的 sha1 命名的临时文件，登记时写入打包文件并删除。
+
+缓存的索引常驻内存（按最近使用排序的 OrderedDict），查找时不访问磁盘；
+总大小超过预算（settings.json 的 "audio_cache_bytes"）时淘汰最久没有使用的发音，垃圾过多时整理打包文件。
+索引保存在缓存目录的 index.json 中，启动时与打包文件核对一次：丢弃打包文件中没有的条目，删除没有登记的发音和
+超过 ORPHAN_AGE 秒的落地文件（较新的可能是另一个正在运行的实例还在下载、登记的文件）。
+命中只在内存中调整最近使用的顺序，不会单独触发索引写盘；顺序随下一次有实际变化的 flush 一起保存。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import atomic_file
+import audio_pack
+import path
+
+# 默认的缓存预算：200MB
+DEFAULT_BUDGET = 200 * 1024 * 1024
+INDEX_FILE = 'index.json'
+PACK_FILE = 'audio.pack'
+# 打包文件中的垃圾超过有效数据且超过该字节数时，flush 时整理
+COMPACT_MIN_GARBAGE = 8 * 1024 * 1024
+# 没有登记的落地文件超过该秒数才视为遗留文件删除
+ORPHAN_AGE = 60 * 60
+
+
+class AudioCache:
+    def __init__(self, directory: str = None, budget: int = DEFAULT_BUDGET):
+        """
+        :param directory: 缓存目录，默认为 path.audio_cache
+        :param budget: 缓存文件的总字节数上限
+        """
+        self.directory = directory or path.audio_cache
+        self.budget = budget
+        self.index_file = os.path.join(self.directory, INDEX_FILE)
+        self.lock = threading.RLock()
+        # {(单词, 口音): 文件大小}，越靠后越是最近使用的
+        self._entries = OrderedDict()
+        self.total = 0
+        self._dirty = False
+        # 索引文件不存在，说明是新建的缓存
+        self.created = not os.path.exists(self.index_file)
+        os.makedirs(self.directory, exist_ok=True)
+        self.pack = audio_pack.AudioPack(os.path.join(self.directory, PACK_FILE))
+        self._load()
+
+    @staticmethod
+    def key(word: str, accent: int):
+        return word.lower(), int(accent)
+
+    def file_name(self, word: str, accent: int):
+        word, accent = self.key(word, accent)
+        return hashlib.sha1(f"{word}\t{accent}".encode('utf-8')).hexdigest() + '.mp3'
+
+    def path_for(self, word: str, accent: int):
+        """
+        :return: 该单词该口音下载时的落地文件路径，登记后写入打包文件并删除
+        """
+        return os.path.join(self.directory, self.file_name(word, accent))
+
+    def _load(self):
+        """
+        内部私有方法，读取索引并与打包文件核对
+        """
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = []
+        for word, accent, size in entries:
+            if (word, accent) in self.pack:
+                self._entries[self.key(word, accent)] = size
+                self.total += size
+            else:
+                self._dirty = True
+        # 没有登记在索引中的发音（例如写入后还没来得及保存索引就退出了）直接删除
+        for key in self.pack.keys():
+            if key not in self._entries:
+                self.pack.remove(*key)
+        # 遗留的落地文件（下载后还没登记就退出了）；较新的文件可能属于另一个实例，留给它登记
+        expired = time.time() - ORPHAN_AGE
+        for name in os.listdir(self.directory):
+            if name.endswith('.mp3'):
+                file_path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(file_path) < expired:
+                        os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item):
+        word, accent = item
+        return self.key(word, accent) in self._entries
+
+    def get(self, word: str, accent: int):
+        """
+        读取缓存的发音，命中时在内存中记为最近使用
+        :return: MP3 数据（bytes），没有缓存时返回None
+        """
+        key = self.key(word, accent)
+        with self.lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self.pack.get(*key)
+
+    def put(self, word: str, accent: int, data: bytes):
+        """
+        写入一个发音，必要时淘汰旧的发音
+        """
+        key = self.key(word, accent)
+        with self.lock:
+            self.pack.add(*key, data)
+            self.total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._dirty = True
+            self._evict(keep=key)
+
+    def add(self, word: str, accent: int, file_path: str = None):
+        """
+        登记一个下载好的落地文件：写入打包文件后删除
+        :param file_path: 文件路径，默认为 path_for(word, accent)
+        :return: 是否写入；文件已经被其他线程登记过时返回False
+        """
+        file_path = file_path or self.path_for(word, accent)
+        with self.lock:
+            try:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # 只有发起下载的一方登记，这里是文件已经被登记过的情况
+                if (word, accent) in self:
+                    return False
+                raise
+            self.put(word, accent, data)
+            os.remove(file_path)
+            return True
+
+    def discard(self, word: str, accent: int):
+        """删除一个缓存文件，例如文件损坏无法播放时"""
+        key = self.key(word, accent)
+        with self.lock:
+            if key not in self._entries:
+                return
+            self._remove(key)
+            self._dirty = True
+
+    def _remove(self, key):
+        self.total -= self._entries.pop(key)
+        self.pack.remove(*key)
+
+    def _evict(self, keep=None):
+        """
+        内部私有方法，总大小超过预算时从最久没有使用的开始删除，调用者需持有锁
+        :param keep: 不淘汰的键（刚刚加入的文件）
+        """
+        for key in list(self._entries):
+            if self.total <= self.budget:
+                break
+            if key != keep:
+                self._remove(key)
+                self._dirty = True
+
+    def import_directory(self, directory: str):
+        """
+        把旧的语音库目录（文件名为 单词 + 口音 + .mp3）中的文件写入缓存，已经缓存的跳过
+        :return: 导入的文件个数
+        """
+        if not os.path.isdir(directory):
+            return 0
+        count = 0
+        for name in os.listdir(directory):
+            match = audio_pack.LEGACY_FILE_NAME.match(name)
+            if match is None or (match.group(1), match.group(2)) in self:
+                continue
+            with open(os.path.join(directory, name), 'rb') as f:
+                self.put(match.group(1), int(match.group(2)), f.read())
+            count += 1
+        return count
+
+    def flush(self):
+        """把打包文件和内存中的索引写入磁盘，垃圾过多时先整理打包文件；没有变化时不写"""
+        with self.lock:
+            if not self._dirty:
+                return
+            garbage = self.pack.garbage
+            if garbage > max(self.pack.live_bytes, COMPACT_MIN_GARBAGE):
+                self.pack.compact()
+            self.pack.flush()
+            text = json.dumps([[word, accent, size] for (word, accent), size in self._entries.items()])
+            atomic_file.write(text, self.index_file)
+            self._dirty = False
+
+
+if __name__ == '__main__':
+    cache = AudioCache()
+    print(f"缓存中有 {len(cache)} 个发音，共 {cache.total / 1024 / 1024:.1f} MB，预算 {cache.budget / 1024 / 1024:.0f} MB，"
+          f"打包文件 {cache.pack.size / 1024 / 1024:.1f} MB")
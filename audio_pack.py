@@ -0,0 +1,296 @@
+"""
+发音打包文件：所有发音保存在同一个只追加写入的打包文件（audio.pack）中，不再是每个单词两个小 MP3 文件。
+
+文件以 MAGIC 开头，之后依次是记录：记录头（单词字节数、口音、数据字节数、数据的 crc32）+ 单词（UTF-8）+ MP3 数据。
+同一个 (单词, 口音) 再次写入时追加新记录，旧记录成为垃圾；删除只从索引中去掉，垃圾由 compact 统一清理。
+索引保存在 audio.pack.idx 中，记录它覆盖到的文件长度；打开时只扫描索引之后追加的部分，
+末尾写了一半的记录（写入时程序退出）会被截掉。
+读取通过 mmap 进行：取一个发音只需查一次索引、切一次片，不需要打开文件。
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+import atomic_file
+
+MAGIC = b'MWAPACK1'
+# 记录头：单词字节数、口音、数据字节数、数据的 crc32
+RECORD = struct.Struct('<HBII')
+INDEX_SUFFIX = '.idx'
+# 旧的语音库目录中的文件名：单词 + 口音 + .mp3
+LEGACY_FILE_NAME = re.compile(r'^(.+)([01])\.mp3$')
+
+
+class PackError(Exception):
+    """打包文件格式错误"""
+
+
+class AudioPack:
+    def __init__(self, file_path: str, index_path: str = None):
+        """
+        :param file_path: 打包文件路径，不存在时新建
+        :param index_path: 索引文件路径，默认为打包文件路径 + INDEX_SUFFIX
+        """
+        self.file_path = file_path
+        self.index_path = index_path or file_path + INDEX_SUFFIX
+        self.lock = threading.RLock()
+        # {(单词, 口音): (数据偏移, 数据字节数, crc32)}
+        self._index = {}
+        # 索引中所有数据的字节数，文件长度减去它（以及记录头）就是垃圾
+        self.live_bytes = 0
+        self.size = 0
+        self._file = None
+        self._mmap = None
+        self._dirty = False
+        self._open()
+
+    @staticmethod
+    def key(word: str, accent: int):
+        return word.lower(), int(accent)
+
+    def _open(self):
+        """
+        内部私有方法，打开（必要时新建）打包文件，读取索引并扫描索引之后追加的记录
+        """
+        if not os.path.exists(self.file_path):
+            directory = os.path.dirname(self.file_path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            with open(self.file_path, 'wb') as f:
+                f.write(MAGIC)
+        self._file = open(self.file_path, 'r+b')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise PackError(f"{self.file_path} 不是发音打包文件")
+        self.size = os.fstat(self._file.fileno()).st_size
+        covered = self._load_index()
+        if covered > self.size:
+            # 打包文件比索引记录的短，索引不可信，重新扫描整个文件
+            self._index.clear()
+            covered = len(MAGIC)
+        if covered < self.size:
+            self._scan(covered)
+        self.live_bytes = sum(length for _, length, _ in self._index.values())
+        self._remap()
+
+    def _load_index(self):
+        """
+        内部私有方法，读取索引文件
+        :return: 索引覆盖到的文件长度，没有可用的索引时为 MAGIC 的长度
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._index = {(word, accent): (offset, length, crc) for word, accent, offset, length, crc in data["entries"]}
+            return data["size"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError, TypeError):
+            self._index = {}
+            return len(MAGIC)
+
+    def _scan(self, offset: int):
+        """
+        内部私有方法，从 offset 开始顺序读取记录并加入索引，末尾不完整的记录截掉
+        """
+        self._file.seek(offset)
+        while offset < self.size:
+            header = self._file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            word_length, accent, length, crc = RECORD.unpack(header)
+            word = self._file.read(word_length)
+            end = offset + RECORD.size + word_length + length
+            if len(word) < word_length or end > self.size:
+                break
+            self._index[(word.decode('utf-8'), accent)] = (offset + RECORD.size + word_length, length, crc)
+            self._file.seek(end)
+            offset = end
+        if offset < self.size:
+            print(f"{self.file_path} 末尾有 {self.size - offset} 字节不完整的记录，已截掉")
+            self._file.truncate(offset)
+            self.size = offset
+        self._dirty = True
+
+    def _remap(self):
+        """
+        内部私有方法，文件增长后重新建立 mmap，调用者需持有锁（或在初始化中）
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.flush()
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, item):
+        word, accent = item
+        return self.key(word, accent) in self._index
+
+    def keys(self):
+        return list(self._index)
+
+    @property
+    def garbage(self):
+        """
+        :return: 不再被索引引用的记录（含记录头）占用的字节数
+        """
+        return self.size - len(MAGIC) - self.live_bytes - sum(
+            RECORD.size + len(word.encode('utf-8')) for word, _ in self._index)
+
+    def get(self, word: str, accent: int):
+        """
+        读取一个发音
+        :return: MP3 数据（bytes），没有时返回None
+        """
+        with self.lock:
+            entry = self._index.get(self.key(word, accent))
+            if entry is None:
+                return None
+            offset, length, _ = entry
+            if offset + length > len(self._mmap):
+                self._remap()
+            return self._mmap[offset:offset + length]
+
+    def add(self, word: str, accent: int, data: bytes):
+        """
+        追加一个发音，已有的同一发音被替换，需调用 flush 保存索引
+        """
+        word, accent = self.key(word, accent)
+        word_bytes = word.encode('utf-8')
+        crc = zlib.crc32(data)
+        with self.lock:
+            self._file.seek(self.size)
+            self._file.write(RECORD.pack(len(word_bytes), accent, len(data), crc) + word_bytes)
+            self._file.write(data)
+            offset = self.size + RECORD.size + len(word_bytes)
+            self.size = offset + len(data)
+            old = self._index.get((word, accent))
+            if old is not None:
+                self.live_bytes -= old[1]
+            self._index[(word, accent)] = (offset, len(data), crc)
+            self.live_bytes += len(data)
+            self._dirty = True
+
+    def remove(self, word: str, accent: int):
+        """
+        从索引中删除一个发音，数据留在文件中直到 compact
+        """
+        with self.lock:
+            entry = self._index.pop(self.key(word, accent), None)
+            if entry is not None:
+                self.live_bytes -= entry[1]
+                self._dirty = True
+
+    def import_directory(self, directory: str):
+        """
+        把旧的语音库目录（文件名为 单词 + 口音 + .mp3）中的文件写入打包文件，已有的跳过
+        :return: 导入的 (单词, 口音) 列表
+        """
+        imported = []
+        if not os.path.isdir(directory):
+            return imported
+        for name in os.listdir(directory):
+            match = LEGACY_FILE_NAME.match(name)
+            if match is None or (match.group(1), match.group(2)) in self:
+                continue
+            with open(os.path.join(directory, name), 'rb') as f:
+                self.add(match.group(1), int(match.group(2)), f.read())
+            imported.append(self.key(match.group(1), match.group(2)))
+        return imported
+
+    def verify(self, repair: bool = False):
+        """
+        校验所有发音数据的 crc32
+        :param repair: 是否从索引中删除校验失败的发音
+        :return: 校验失败的 (单词, 口音) 列表
+        """
+        with self.lock:
+            self._remap()
+            bad = [key for key, (offset, length, crc) in self._index.items()
+                   if offset + length > self.size or zlib.crc32(self._mmap[offset:offset + length]) != crc]
+            if repair:
+                for key in bad:
+                    self.remove(*key)
+            return bad
+
+    def compact(self):
+        """
+        只保留索引中的发音，重写整个打包文件，以“临时文件 + 重命名”的方式替换
+        :return: 回收的字节数
+        """
+        with self.lock:
+            before = self.size
+            self._remap()
+            index = {}
+            with atomic_file.temp_file(self.file_path, binary=True) as (f, temp_path):
+                f.write(MAGIC)
+                position = len(MAGIC)
+                # 按原来的位置顺序写入，保持文件的局部性
+                for (word, accent), (offset, length, crc) in sorted(self._index.items(), key=lambda x: x[1][0]):
+                    word_bytes = word.encode('utf-8')
+                    f.write(RECORD.pack(len(word_bytes), accent, length, crc) + word_bytes)
+                    f.write(self._mmap[offset:offset + length])
+                    position += RECORD.size + len(word_bytes)
+                    index[(word, accent)] = (position, length, crc)
+                    position += length
+            try:
+                # Windows 上不能替换仍被映射的文件，先关闭
+                self._mmap.close()
+                self._mmap = None
+                self._file.close()
+                atomic_file.replace(temp_path, self.file_path)
+            except BaseException:
+                if self._mmap is None:
+                    self._file = open(self.file_path, 'r+b')
+                    self._remap()
+                raise
+            self._file = open(self.file_path, 'r+b')
+            self._index = index
+            self.size = position
+            self._dirty = True
+            self._remap()
+            self.flush()
+            return before - self.size
+
+    def flush(self):
+        """把追加的数据写入磁盘，并以“临时文件 + 重命名”的方式保存索引，没有变化时不写"""
+        with self.lock:
+            if not self._dirty:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            text = json.dumps({"size": self.size, "entries": [[word, accent, offset, length, crc] for
+                                                              (word, accent), (offset, length, crc) in
+                                                              self._index.items()]})
+            atomic_file.write(text, self.index_path)
+            self._dirty = False
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    import path
+
+    pack = AudioPack(os.path.join(path.audio_cache, 'audio.pack'))
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'import':
+        for legacy_directory in sys.argv[2:] or [path.Speech, path.today_mp3, path.yesterday_mp3]:
+            print(f"{legacy_directory}：导入 {len(pack.import_directory(legacy_directory))} 个发音")
+    elif command == 'verify':
+        print(f"校验失败 {len(pack.verify(repair='--repair' in sys.argv))} 个发音")
+    elif command == 'compact':
+        print(f"回收 {pack.compact() / 1024:.1f} KB")
+    print(f"{pack.file_path}：{len(pack)} 个发音，文件 {pack.size / 1024 / 1024:.1f} MB，"
+          f"垃圾 {pack.garbage / 1024 / 1024:.1f} MB")
+    pack.close()
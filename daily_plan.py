@@ -0,0 +1,144 @@
+"""
+每日学习计划：每天第一次启动时计算一次当天的新词和复习词，连同每个单词先显示单词还是释义的标志、
+发音是否已经下载好的状态一起保存到 today_data/daily_plan.json。
+“每日任务”和“加练5个”都直接读取这份计划，不再每次点击都从记录中重新计算；
+计划的生成时间和耗时也记录在文件中，便于观察。
+"""
+import datetime
+import json
+import random
+import threading
+import time
+
+import atomic_file
+import path
+import record
+import take_data
+
+# 计划中的两组单词
+NEW = "new"
+REVIEW = "review"
+# 每天的新词数
+DAILY_NEW_NUMBER = 15
+
+
+class DailyPlan:
+    _cached = None
+    _cache_lock = threading.Lock()
+
+    def __init__(self, date: str, words: dict, flags: dict = None, audio: dict = None,
+                 built_at: str = None, build_ms: float = 0.0, file_path: str = None):
+        """
+        :param date: 计划对应的日期字符串
+        :param words: {NEW/REVIEW: [单词索引]}
+        :param flags: {NEW/REVIEW: "0101..."}，每个单词一位，1 表示混合模式下先显示释义
+        :param audio: {NEW/REVIEW: "0101..."}，每个单词一位，1 表示发音已经下载好
+        :param built_at: 生成计划的时间
+        :param build_ms: 生成计划的耗时（毫秒）
+        :param file_path: 计划文件，默认为 path.daily_plan
+        """
+        self.date = date
+        self.words = words
+        self.flags = flags or {kind: ''.join(random.choice('01') for _ in data) for kind, data in words.items()}
+        self.audio = audio or {kind: '0' * len(data) for kind, data in words.items()}
+        self.built_at = built_at
+        self.build_ms = build_ms
+        self.file_path = file_path or path.daily_plan
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, file_path: str = None):
+        """
+        读取计划文件
+        :return: DailyPlan，文件不存在或无法解析时返回None
+        """
+        file_path = file_path or path.daily_plan
+        try:
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+            return cls(data["date"], data["words"], data["flags"], data["audio"],
+                       data.get("built_at"), data.get("build_ms", 0.0), file_path)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    @classmethod
+    def build(cls, recorder: record.Record, today: datetime.date = None, file_path: str = None):
+        """
+        计算当天的计划并保存：新词沿用当天已有的 TodayData（如升级前已经生成、学了一半），没有时从未学习的单词中抽取并写入，
+        复习词为昨天学习的单词
+        :param recorder: 共用的 Record 实例
+        :param today: 计划的日期，默认为今天
+        :param file_path: 计划文件，默认为 path.daily_plan
+        :return: DailyPlan
+        """
+        start = time.perf_counter()
+        today = today or datetime.date.today()
+        new = list(recorder.get(record.RecordType.TodayData, today))
+        if not new:
+            new = recorder.sample_unlearned(DAILY_NEW_NUMBER, take_data.vocabulary_size())
+            recorder.write(record.RecordType.TodayData, today, new)
+        review = recorder.get(record.RecordType.LearnedAlready, today - datetime.timedelta(days=1))
+        plan = cls(str(today), {NEW: new, REVIEW: review}, file_path=file_path)
+        plan.built_at = datetime.datetime.now().isoformat(timespec='seconds')
+        plan.build_ms = round((time.perf_counter() - start) * 1000, 3)
+        plan.save()
+        print(f"已生成 {plan.date} 的每日计划：新词 {len(new)} 个，复习词 {len(review)} 个，耗时 {plan.build_ms} ms")
+        return plan
+
+    @classmethod
+    def for_today(cls, recorder: record.Record, today: datetime.date = None):
+        """
+        获取当天的计划：先查内存中的缓存，其次读取计划文件，都不是当天的计划时重新生成
+        :param recorder: 共用的 Record 实例
+        :param today: 日期，默认为今天
+        :return: DailyPlan
+        """
+        today = today or datetime.date.today()
+        with cls._cache_lock:
+            plan = cls._cached
+            if plan is None or plan.date != str(today):
+                plan = cls.load()
+                if plan is None or plan.date != str(today):
+                    plan = cls.build(recorder, today)
+                cls._cached = plan
+            return plan
+
+    def reverse_of(self, kind: str):
+        """
+        :param kind: NEW 或 REVIEW
+        :return: {单词索引: 0/1}，混合模式下每个单词先显示单词还是释义
+        """
+        return {word_index: int(flag) for word_index, flag in zip(self.words[kind], self.flags[kind])}
+
+    def missing_audio(self, kind: str):
+        """
+        :param kind: NEW 或 REVIEW
+        :return: 发音还没有下载好的单词位置列表
+        """
+        return [i for i, ready in enumerate(self.audio[kind]) if ready == '0']
+
+    def set_audio_ready(self, kind: str, position: int):
+        """
+        标记一个单词的发音已经下载好，需调用 save 写盘
+        :param kind: NEW 或 REVIEW
+        :param position: 单词在该组中的位置
+        """
+        with self.lock:
+            audio = self.audio[kind]
+            self.audio[kind] = audio[:position] + '1' + audio[position + 1:]
+
+    def save(self):
+        """以“临时文件 + 重命名”的方式原子地写入计划文件"""
+        with self.lock:
+            text = json.dumps({"date": self.date, "built_at": self.built_at, "build_ms": self.build_ms,
+                               "words": self.words, "flags": self.flags, "audio": self.audio})
+            atomic_file.write(text, self.file_path)
+
+
+if __name__ == '__main__':
+    today_plan = DailyPlan.load()
+    if today_plan is None:
+        print("还没有生成每日计划")
+    else:
+        print(f"{today_plan.date} 的每日计划生成于 {today_plan.built_at}，耗时 {today_plan.build_ms} ms，"
+              f"新词 {len(today_plan.words[NEW])} 个，复习词 {len(today_plan.words[REVIEW])} 个")
@@ -0,0 +1,329 @@
+"""
+发音下载引擎：固定数量的工作线程从同一个队列中取下载任务，
+每个工作线程对每个主机保持一条持久（keep-alive）的 HTTP 连接，按主机限制请求频率，
+请求超时或服务器暂时出错时按指数退避重试，文件以“临时文件 + 重命名”的方式写入。
+
+一批任务（例如一轮学习的全部单词）一次性提交，返回的 Batch 可以等待完成、查看失败的任务。
+同一个保存路径同时只有一个下载在进行：朗读、预下载等多处同时请求同一个文件时，后来的请求只等待已有的下载结果。
+下载地址只是普通的 URL，可以指向本地启动的 http.server 进行测试。
+"""
+import http.client
+import itertools
+import os
+import queue
+import threading
+import time
+import urllib.parse
+
+import atomic_file
+
+DEFAULT_WORKERS = 4
+# 每个主机每秒最多发起的请求数，0 表示不限制；默认不限制，同时进行的请求数已经由工作线程数限定
+DEFAULT_RATE = 0
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 3
+# 第 n 次重试前等待 BACKOFF * 2^n 秒
+BACKOFF = 0.5
+# 复用的持久连接已被服务器关闭时出现的错误，换一条新连接立即重发，不计入重试
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError,
+                           ConnectionAbortedError, BrokenPipeError)
+# 这些状态码表示服务器暂时不可用，可以重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 3
+# 任务优先级，数值小的先下载：正在等待播放的单个文件最先，其次是接下来几张卡片，最后是批量预下载
+PRIORITY_URGENT = 0
+PRIORITY_LOOKAHEAD = 1
+PRIORITY_BATCH = 2
+
+
+class DownloadError(Exception):
+    """下载失败（状态码不可重试、重定向过多或重试次数用完）"""
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        """
+        :param rate: 每个主机每秒最多的请求数，0 表示不限制
+        """
+        self.interval = 1 / rate if rate > 0 else 0
+        # {主机: 下一个请求最早可以发出的时间}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        """等到可以向该主机发出下一个请求"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, 0))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Batch:
+    def __init__(self, total: int, callback=None):
+        """
+        一批下载任务的进度
+        :param total: 任务总数
+        :param callback: 全部任务结束后调用 callback(batch)，在工作线程中执行
+        """
+        self.total = total
+        self.done = 0
+        # {文件路径: 失败原因}
+        self.failed = {}
+        # 由本批次发起下载的文件路径；合并到其他批次的文件不在其中，由发起方负责后续处理（如登记到缓存）
+        self.owned = set()
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        if total == 0:
+            self._complete()
+
+    def _finish(self, file_path: str, error: Exception = None):
+        with self._lock:
+            self.done += 1
+            if error is not None:
+                self.failed[file_path] = str(error)
+            finished = self.done == self.total
+        if finished:
+            self._complete()
+
+    def _complete(self):
+        # 先执行回调再通知等待方，wait 返回时回调（例如登记到缓存）已经完成
+        if self._callback is not None:
+            try:
+                self._callback(self)
+            except Exception as e:
+                # 回调出错不能影响工作线程继续处理后面的任务
+                print(f"下载完成回调出错：{e}")
+        self._event.set()
+
+    def wait(self, timeout: float = None):
+        """
+        等待全部任务结束
+        :return: 是否已经全部结束（超时返回False）
+        """
+        return self._event.wait(timeout)
+
+    @property
+    def ok(self):
+        return self._event.is_set() and not self.failed
+
+
+class _Flight:
+    __slots__ = ("url", "priority", "batches", "started")
+
+    def __init__(self, url: str, priority: int):
+        """
+        一个正在排队或下载中的文件
+        :param url: 下载地址
+        :param priority: 当前排队的优先级
+        """
+        self.url = url
+        self.priority = priority
+        # 等待这个文件的批次，下载结束后逐一通知
+        self.batches = []
+        self.started = False
+
+
+class Downloader:
+    def __init__(self, workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES):
+        """
+        :param workers: 工作线程数，也是同时进行的下载数的上限
+        :param rate: 每个主机每秒最多的请求数
+        :param timeout: 连接和读取的超时（秒）
+        :param retries: 失败后的最多重试次数
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = RateLimiter(rate)
+        # (优先级, 提交序号, _Flight, 保存路径)，同一优先级内按提交顺序
+        self._queue = queue.PriorityQueue()
+        # {保存路径: _Flight}，正在排队或下载中的文件
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # 因为同一文件已经在下载而合并掉的请求数
+        self.deduplicated = 0
+        self._sequence = itertools.count()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        # 每个工作线程自己的 {(协议, 主机): 连接}
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        按 settings.json 中的 "download_workers"、"download_rate"、"download_timeout"、"download_retries" 创建
+        :param settings: settings.Settings 实例
+        """
+        return cls(settings.get("download_workers", DEFAULT_WORKERS), settings.get("download_rate", DEFAULT_RATE),
+                   settings.get("download_timeout", DEFAULT_TIMEOUT), settings.get("download_retries", DEFAULT_RETRIES))
+
+    def download(self, jobs, callback=None, priority: int = PRIORITY_BATCH):
+        """
+        提交一批下载任务，立即返回
+        :param jobs: (URL, 保存路径) 序列
+        :param callback: 全部任务结束后调用 callback(batch)
+        :param priority: 任务优先级，PRIORITY_URGENT、PRIORITY_LOOKAHEAD 或 PRIORITY_BATCH
+        :return: Batch
+        """
+        jobs = list(jobs)
+        batch = Batch(len(jobs), callback)
+        if jobs:
+            self._start_workers()
+            with self._inflight_lock:
+                for url, file_path in jobs:
+                    flight = self._inflight.get(file_path)
+                    if flight is None:
+                        flight = self._inflight[file_path] = _Flight(url, priority)
+                        self._queue.put((priority, next(self._sequence), flight, file_path))
+                        batch.owned.add(file_path)
+                    else:
+                        self.deduplicated += 1
+                        # 还在排队的文件被更紧急地请求时，以新的优先级再排一次，先取出的一方下载
+                        if not flight.started and priority < flight.priority:
+                            flight.priority = priority
+                            self._queue.put((priority, next(self._sequence), flight, file_path))
+                    flight.batches.append(batch)
+        return batch
+
+    def fetch(self, url: str, file_path: str, callback=None):
+        """
+        下载单个文件并等待完成
+        :param callback: 下载结束后、返回前调用 callback(batch)
+        :return: Batch
+        :raise DownloadError: 下载失败
+        """
+        batch = self.download([(url, file_path)], callback, PRIORITY_URGENT)
+        batch.wait()
+        if batch.failed:
+            raise DownloadError(f"{url} 下载失败：{batch.failed[file_path]}")
+        return batch
+
+    def _start_workers(self):
+        """
+        内部私有方法，第一次提交任务时启动工作线程
+        """
+        with self._threads_lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"download-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            _, _, flight, file_path = self._queue.get()
+            with self._inflight_lock:
+                # 同一文件因提高优先级而重复排队，已经被其他工作线程取走的跳过
+                if flight.started:
+                    continue
+                flight.started = True
+            error = None
+            try:
+                self._fetch(flight.url, file_path)
+            except Exception as e:
+                error = e
+            with self._inflight_lock:
+                del self._inflight[file_path]
+            for batch in flight.batches:
+                batch._finish(file_path, error)
+
+    def _connection(self, scheme: str, host: str):
+        """
+        内部私有方法，获取当前线程到该主机的持久连接，没有时新建
+        :return: (连接, 是否是复用的连接)
+        """
+        connections = self._local.__dict__.setdefault("connections", {})
+        connection = connections.get((scheme, host))
+        if connection is not None:
+            return connection, True
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connections[(scheme, host)] = connection_class(host, timeout=self.timeout)
+        return connection, False
+
+    def _drop_connection(self, scheme: str, host: str):
+        connection = self._local.__dict__.get("connections", {}).pop((scheme, host), None)
+        if connection is not None:
+            connection.close()
+
+    def _fetch(self, url: str, file_path: str):
+        """
+        内部私有方法，在工作线程中下载一个文件：跟随重定向，可重试的错误按指数退避重试
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(BACKOFF * 2 ** (attempt - 1))
+            try:
+                body = self._get(url)
+            except DownloadError:
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                # 超时、连接被重置等网络错误
+                error = e
+                continue
+            if isinstance(body, int):
+                error = DownloadError(f"HTTP {body}")
+                continue
+            self._write(body, file_path)
+            return
+        raise DownloadError(f"重试 {self.retries} 次后仍然失败：{error}")
+
+    def _get(self, url: str):
+        """
+        内部私有方法，发出 GET 请求
+        :return: 响应内容（bytes），遇到可重试的状态码时返回该状态码
+        :raise DownloadError: 不可重试的状态码或重定向过多
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            target = parts.path or '/'
+            if parts.query:
+                target += '?' + parts.query
+            self.limiter.wait(parts.netloc)
+            response, body = self._request(parts.scheme, parts.netloc, target)
+            if response.will_close:
+                self._drop_connection(parts.scheme, parts.netloc)
+            if response.status in REDIRECT_STATUS and response.getheader('Location'):
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            if response.status == 200:
+                return body
+            if response.status in RETRY_STATUS:
+                return response.status
+            raise DownloadError(f"HTTP {response.status}")
+        raise DownloadError(f"重定向超过 {MAX_REDIRECTS} 次")
+
+    def _request(self, scheme: str, host: str, target: str):
+        """
+        内部私有方法，在持久连接上发出 GET 请求；复用的连接已被服务器关闭时换新连接立即重发一次
+        :return: (响应, 响应内容)
+        """
+        while True:
+            connection, reused = self._connection(scheme, host)
+            try:
+                connection.request('GET', target)
+                response = connection.getresponse()
+                return response, response.read()
+            except STALE_CONNECTION_ERRORS:
+                self._drop_connection(scheme, host)
+                if not reused:
+                    raise
+            except BaseException:
+                self._drop_connection(scheme, host)
+                raise
+
+    @staticmethod
+    def _write(content: bytes, file_path: str):
+        """
+        内部私有方法，以“临时文件 + 重命名”的方式写入，读取方不会看到只写了一半的文件
+        """
+        directory = os.path.dirname(file_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # 下载的文件只是中转，随后会写入发音缓存，不需要 fsync
+        atomic_file.write(content, file_path, sync=False)
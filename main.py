@@ -1,6 +1,11 @@
 import datetime
 import random
+import threading
+from array import array
+import daily_plan
 import record
+import schedule
+import take_data
 
 """
 这个程序主要实现了根据不同模式和数据来源进行单词学习的功能。
@@ -8,7 +13,7 @@ import record
 然后获取相应的数据并运行学习模式。在学习模式中，根据不同的模式显示单词或释义，
 并通过键盘事件来控制学习进度和执行其他操作。
 其中，take_data_sources 方法负责根据数据来源类型获取数据，
-random_select_and_permute 方法用于对数据进行随机选择和排列，
+Session 类按需逐个生成本轮的单词卡片，支持删除当前卡片、向后预读和中途追加单词，
 mode_run 方法则是整个学习过程的核心逻辑，包括数据展示和键盘事件处理。
 """
 
@@ -43,7 +48,7 @@ word_mode_list = [WordMode.C_to_E, WordMode.E_to_C, WordMode.Mixed_Mode]
 
 
 # 定义了多种数据来源类型，包括昨天（Yesterday）、前天（TheDayBeforeYesterday）等不同时间范围，以及已学习（Learned）、
-# 未学习（NotLearnedYet）、完全掌握（FullyMastered）等状态
+# 未学习（NotLearnedYet）、完全掌握（FullyMastered）等状态，以及按间隔重复调度已经到期（Due）的单词
 class DataSourcesType:
     Today = "今天"
     Yesterday = "昨天"
@@ -53,15 +58,194 @@ class DataSourcesType:
     Learned = "已学习"
     NotLearnedYet = "未学习"
     FullyMastered = "完全掌握"
+    Due = "到期"
 
 
 data_sources_type_list = [DataSourcesType.Today, DataSourcesType.Yesterday, DataSourcesType.TheDayBeforeYesterday,
-                          DataSourcesType.ThirdDays, DataSourcesType.SevenDays, DataSourcesType.Learned]
+                          DataSourcesType.ThirdDays, DataSourcesType.SevenDays, DataSourcesType.Learned,
+                          DataSourcesType.Due]
+
+
+# Card类是会话中的一张单词卡片，同时作为双向链表的节点
+class Card:
+    __slots__ = ("word_index", "reverse", "prev", "next")
+
+    def __init__(self, word_index: int, reverse: int):
+        """
+        :param word_index: 单词索引
+        :param reverse: 0 表示先显示单词，1 表示先显示释义
+        """
+        self.word_index = word_index
+        self.reverse = reverse
+        self.prev = None
+        self.next = None
+
+
+# Session类是一轮学习的卡片流：卡片在第一次被访问时才从单词来源中抽取（随机模式下为按需进行的 Fisher-Yates 洗牌），
+# 已抽取的卡片组成双向链表，游标前后移动、删除当前卡片都是 O(1)
+class Session:
+    def __init__(self, word_mode: WordMode, words, limit: int = None, shuffle: bool = True, reverse_of: dict = None):
+        """
+        :param word_mode: 单词模式，决定每张卡片先显示单词还是释义
+        :param words: 单词来源，单词索引序列
+        :param limit: 最多抽取的卡片数，None表示全部
+        :param shuffle: 是否随机抽取，False时按来源顺序
+        :param reverse_of: 混合模式下预先确定的 {单词索引: 0/1}，不在其中的单词随机决定
+        """
+        self.word_mode = word_mode
+        self.shuffle = shuffle
+        self.reverse_of = reverse_of or {}
+        # 尚未抽取的单词，按顺序模式时从 _next 开始读取
+        self._pool = array(record.WORD_ARRAY_TYPE, words)
+        self._next = 0
+        # 还可以从来源中抽取的卡片数
+        self._remaining = len(self._pool) if limit is None else min(limit, len(self._pool))
+        # 中途追加的单词，来源抽完后按追加顺序从 _extra_next 开始读取
+        self._extra = array(record.WORD_ARRAY_TYPE)
+        self._extra_next = 0
+        self._head = self._tail = None
+        self._count = 0
+        # 游标指向的卡片及其位置
+        self.current = None
+        self.position = -1
+
+    def __len__(self):
+        return self._count + self._remaining + len(self._extra) - self._extra_next
+
+    def __iter__(self):
+        """依次生成全部卡片的单词索引（会抽取所有剩余卡片）"""
+        card = self._head
+        while True:
+            if card is None:
+                card = self._draw()
+                if card is None:
+                    return
+            yield card.word_index
+            card = card.next
+
+    def _draw(self):
+        """
+        内部私有方法，从来源中抽取一个单词，追加到链表末尾
+        :return: 新的 Card，来源已取完时返回None
+        """
+        if self._remaining > 0:
+            if self.shuffle:
+                # 随机选一个单词换到末尾再取出
+                j = random.randrange(len(self._pool))
+                self._pool[j], self._pool[-1] = self._pool[-1], self._pool[j]
+                word_index = self._pool.pop()
+            else:
+                word_index = self._pool[self._next]
+                self._next += 1
+            self._remaining -= 1
+        elif self._extra_next < len(self._extra):
+            word_index = self._extra[self._extra_next]
+            self._extra_next += 1
+        else:
+            return None
+        match self.word_mode:
+            case WordMode.C_to_E:
+                reverse = 1
+            case WordMode.Mixed_Mode:
+                reverse = self.reverse_of.get(word_index)
+                if reverse is None:
+                    reverse = random.randint(0, 1)
+            case _:
+                reverse = 0
+        card = Card(word_index, reverse)
+        if self._tail is None:
+            self._head = card
+        else:
+            self._tail.next = card
+            card.prev = self._tail
+        self._tail = card
+        self._count += 1
+        return card
+
+    def seek(self, position: int):
+        """
+        把游标移动到指定位置，按需抽取卡片；移动的代价与距离成正比，逐张前后翻动时为 O(1)
+        :param position: 卡片位置（0-based）
+        :return: 该位置的 Card
+        """
+        if not 0 <= position < len(self):
+            raise IndexError(f"卡片位置 {position} 超出范围 0~{len(self) - 1}")
+        if self.current is None:
+            self.current = self._head or self._draw()
+            self.position = 0
+        while self.position < position:
+            self.current = self.current.next or self._draw()
+            self.position += 1
+        while self.position > position:
+            self.current = self.current.prev
+            self.position -= 1
+        return self.current
+
+    def peek(self, count: int):
+        """
+        预读从游标开始（含当前卡片）的若干张卡片，不移动游标
+        :param count: 卡片数
+        :return: 单词索引列表
+        """
+        card = self.current or self._head or self._draw()
+        _return = []
+        while card is not None and len(_return) < count:
+            _return.append(card.word_index)
+            card = card.next or self._draw()
+        return _return
+
+    def remove_current(self):
+        """
+        删除游标指向的卡片，游标移到下一张；删除的是最后一张时移到上一张
+        :return: 被删除的 Card
+        """
+        card = self.current
+        if card is None:
+            raise IndexError("游标没有指向任何卡片")
+        if card.prev is None:
+            self._head = card.next
+        else:
+            card.prev.next = card.next
+        if card.next is None:
+            self._tail = card.prev
+        else:
+            card.next.prev = card.prev
+        self._count -= 1
+        if card.next is not None:
+            self.current = card.next
+        elif len(self) > self._count:
+            self.current = self._draw()
+        else:
+            self.current = card.prev
+            self.position -= 1
+        card.prev = card.next = None
+        return card
+
+    def extend(self, words=(), count: int = 0):
+        """
+        在本轮中追加卡片，不影响已经抽取的卡片
+        :param words: 追加的单词索引，排在本轮其余卡片之后
+        :param count: 另外从来源中剩余的单词里再多抽取的个数
+        """
+        self._extra.extend(words)
+        self._remaining = min(self._remaining + count, len(self._pool) - self._next)
+
+    def word_indices(self):
+        """
+        :return: 已抽取的卡片和来源中剩余单词的单词索引，不会触发抽取
+        """
+        card = self._head
+        while card is not None:
+            yield card.word_index
+            card = card.next
+        yield from self._pool[self._next:]
+        yield from self._extra[self._extra_next:]
 
 
 class Main:
     def __init__(self, word_mode: WordMode, number: int, data_sources_type: DataSourcesType, study_mode: StudyMode,
-                 special_mode = DailyTasks.DailyTasksData(None, None)):
+                 special_mode = DailyTasks.DailyTasksData(None, None), recorder: record.Record = None,
+                 scheduler: schedule.Scheduler = None):
         """
         初始化函数，用于设置学习的模式、要获取的数据数量和数据来源类型，
         同时初始化数据来源列表、记录类实例、获取当前日期和单词数据类实例，
@@ -70,6 +254,8 @@ class Main:
         :param word_mode: 学习模式，取值为 Mode 类中定义的三种模式之一
         :param number: 要获取的数据数量
         :param data_sources_type: 数据来源类型，取值为 DataSourcesType 类中定义的类型之一
+        :param recorder: 共用的 Record 实例，传入后可以读到其中尚未写盘的记录，默认新建一个
+        :param scheduler: 间隔重复调度器，默认使用 schedule.json 的共享实例
         """
         # 初始化模式、要获取的数据数量和数据来源类型
         self.special_mode = special_mode
@@ -79,8 +265,11 @@ class Main:
         self.number = number
         self.data_sources_type = data_sources_type
         self.data_sources = []
+        # 每日任务使用每日计划中预先确定的显示顺序
+        self.reverse_of = None
         # 初始化 Record 类的实例，用于数据记录操作（可能是读取或写入学习进度等相关数据）
-        self.record = record.Record()
+        self.record = recorder if recorder is not None else record.Record()
+        self.scheduler = scheduler if scheduler is not None else schedule.Scheduler.shared()
 
         # 获取当前日期
         self.today = datetime.date.today()
@@ -88,22 +277,19 @@ class Main:
         """if self.special_mode is not None and self.number == 5:
             self.data_sources_type = DataSourcesType.NotLearnedYet"""
 
+        # 每日任务的数量由任务决定，在取数据之前设置，计划中没有复习词而改用菜单数据来源时也按这个数量取
+        if self.special_mode.daily_name is not None:
+            self.number = self.special_mode.length
+
         # 调用方法获取数据来源
         self.take_data_sources()
 
+        # 卡片在学习过程中按需抽取，开始时不需要打乱整个来源
         if self.special_mode.daily_name is None:
-            self.data = self.random_select_and_permute(self.data_sources, num_to_select=self.number)
+            self.data = Session(word_mode, self.data_sources, limit=self.number)
         else:
-            self.data = self.data_sources
-            self.number = self.special_mode.length
-
-        match word_mode:
-            case WordMode.C_to_E:
-                self.random_table_0_and_1 = [1] * self.number
-            case WordMode.E_to_C:
-                self.random_table_0_and_1 = [0] * self.number
-            case WordMode.Mixed_Mode:
-                self.random_table_0_and_1 = [random.randint(0, 1) for _ in range(self.number)]
+            self.data = Session(word_mode, self.data_sources, limit=self.number, shuffle=False,
+                                reverse_of=self.reverse_of)
         if len(self.data) == 0:
             print(word_mode, number, data_sources_type, study_mode)
             raise EOFError("没有数据！")
@@ -118,20 +304,22 @@ class Main:
         # 根据数据来源类型进行不同的操作
 
         if self.special_mode.daily_name == DailyTasks.study:
-            if self.special_mode.length == 15:
-                self.data_sources = self.record.get(record.RecordType.TodayData, self.today)
+            if self.special_mode.length == daily_plan.DAILY_NEW_NUMBER:
+                # 每日任务的新词直接取自当天的计划
+                plan = daily_plan.DailyPlan.for_today(self.record, self.today)
+                self.data_sources = list(plan.words[daily_plan.NEW])
+                self.reverse_of = plan.reverse_of(daily_plan.NEW)
                 return
             else:
                 self.data_sources_type = DataSourcesType.NotLearnedYet
-        elif self.special_mode.daily_name == StudyMode.Review:
-            temp_list = []
-            day_number = 1
-            while len(temp_list) < self.number:
-                temp_list.extend(self.record.get(record.RecordType.LearnedAlready,
-                                                 self.today - datetime.timedelta(days=day_number)))
-                day_number += 1
-            self.data_sources = temp_list[:self.number]
-            return
+        elif self.special_mode.daily_name == DailyTasks.review:
+            # 加练从当天计划的复习词中随机取，计划中没有复习词时按菜单选择的数据来源
+            plan = daily_plan.DailyPlan.for_today(self.record, self.today)
+            review = plan.words[daily_plan.REVIEW]
+            if review:
+                self.data_sources = random.sample(review, min(self.special_mode.length, len(review)))
+                self.reverse_of = plan.reverse_of(daily_plan.REVIEW)
+                return
 
         """ if self.number != 5 and self.special_mode is not None:
             if self.special_mode == DailyTasks.study:
@@ -168,21 +356,14 @@ class Main:
                 self.data_sources = self.record.get(record.RecordType.LearnedAlready)
             # 如果是未学习的数据来源类型
             case DataSourcesType.NotLearnedYet:
-                all_existing_numbers = set()
-                # 合并 fully_mastered 和 learned_already 字典中的所有数字到一个集合，用于避免选取重复的数字
-                for d in [self.record.fully_mastered, self.record.learned_already]:
-                    for value_list in d.values():
-                        all_existing_numbers.update(value_list)
-                # 循环选取指定数量的未学习数据
-                while len(self.data_sources) < self.number:
-                    random_number = random.randint(0, 7508)
-                    if random_number not in all_existing_numbers:
-                        self.data_sources.append(random_number)
-                        all_existing_numbers.add(random_number)  # 将已选数字添加到集合中，避免重复选择
+                # 从记录维护的未学习单词池中直接抽取，不足时有多少取多少，全部学完时为空
+                self.data_sources = self.record.sample_unlearned(self.number, take_data.vocabulary_size())
             # 如果是完全掌握的数据来源类型，将 fully_mastered 中的所有数据添加到数据来源列表
             case DataSourcesType.FullyMastered:
-                for item_list in self.record.fully_mastered.values():
-                    self.data_sources.extend(item_list)
+                self.data_sources = self.record.get(record.RecordType.FullyMastered)
+            # 如果是到期的数据来源类型，从调度器中取复习优先级最高的到期单词
+            case DataSourcesType.Due:
+                self.data_sources = self.scheduler.prioritized(self.number, self.today)
 
     def reduce_days(self, days: int):
         """
@@ -201,32 +382,101 @@ class Main:
             record_type = None
 
         if days != 0:
-            # 循环获取指定天数范围内的已学习数据
-            for day in range(1, days + 1):
-                _return.extend(self.record.get(record_type,
-                                               self.today - datetime.timedelta(days=day)))
+            # 一次范围查询获取指定天数范围内（不含今天）的数据，从昨天开始由新到旧
+            _return.extend(self.record.get_range(record_type,
+                                                 self.today - datetime.timedelta(days=days),
+                                                 self.today - datetime.timedelta(days=1)))
         else:
             _return.extend(self.record.get(record_type, self.today))
         return _return
 
-    @staticmethod
-    def random_select_and_permute(input_list: list[int], num_to_select: int = None):
+    def extend(self, number: int):
         """
-        从给定的数字列表中选择任意个数（可指定数量，默认全选）的元素，随机排列后组成新列表。
+        在本轮中追加单词（“加练”）：未学习来源从未学习单词中抽取不在本轮中的单词，其他来源从剩余的来源单词中多抽取
+        :param number: 追加的个数
+        :return: 实际追加的个数
+        """
+        before = len(self.data)
+        if self.data_sources_type == DataSourcesType.NotLearnedYet:
+            present = set(self.data.word_indices())
+            # 多抽取本轮的单词数，保证去掉本轮已有的单词后仍然够数
+            candidates = self.record.sample_unlearned(number + len(present), take_data.vocabulary_size())
+            self.data.extend([word for word in candidates if word not in present][:number])
+        else:
+            self.data.extend(count=number)
+        return len(self.data) - before
 
-        :param input_list: 输入的数字列表
-        :param num_to_select: 要选择的元素个数，默认为 None，表示选择全部元素
-        :return: 随机排列后的新列表
+
+# SessionPrefetcher类在后台线程中提前构建下一轮学习的 Main，用户点击开始时只需取出
+class SessionPrefetcher:
+    def __init__(self, recorder: record.Record, scheduler: schedule.Scheduler):
+        """
+        :param recorder: 共用的 Record 实例
+        :param scheduler: 共用的间隔重复调度器
+        """
+        self.recorder = recorder
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+        # 正在构建或已经构建好的会话对应的 (单词模式, 数量, 数据来源类型, 学习模式)
+        self._key = None
+        # 构建会话时记录和调度数据的版本，取出时版本不一致说明会话已过期
+        self._version = None
+        # 构建好的 Main，或构建时抛出的 EOFError
+        self._result = None
+        self._thread = None
+
+    def _current_version(self):
+        return self.recorder.version(), self.scheduler.version
+
+    def request(self, word_mode: WordMode, number: int, data_sources_type: DataSourcesType, study_mode: StudyMode):
         """
-        # 如果未指定要选择的数量或指定数量大于输入列表长度，则选择全部元素
-        if num_to_select is None or num_to_select > len(input_list):
-            num_to_select = len(input_list)
+        按当前选择在后台构建会话；已有同样选择且未过期的会话时什么也不做
+        在菜单选择、数量变化和记录修改后调用
+        """
+        key = (word_mode, number, data_sources_type, study_mode)
+        with self.lock:
+            if self._key == key and (self._thread is not None or self._version == self._current_version()):
+                return
+            self._key = key
+            self._result = None
+            self._thread = threading.Thread(target=self._build, args=(key,), daemon=True)
+            self._thread.start()
 
-        # 从输入列表中随机选取指定数量的元素
-        selected_list = random.sample(input_list, num_to_select)
-        # 对选取的元素进行随机排列
-        random.shuffle(selected_list)
-        return selected_list
+    def _build(self, key):
+        """
+        内部私有方法，在后台线程中构建会话
+        """
+        version = self._current_version()
+        try:
+            result = Main(*key, recorder=self.recorder, scheduler=self.scheduler)
+        except EOFError as e:
+            result = e
+        with self.lock:
+            # 构建期间选择已经改变时丢弃结果
+            if self._key == key and self._thread is threading.current_thread():
+                self._result = result
+                self._version = version
+                self._thread = None
+
+    def take(self, word_mode: WordMode, number: int, data_sources_type: DataSourcesType, study_mode: StudyMode):
+        """
+        取出与选择一致且未过期的会话，正在构建时等待其完成；取出后缓存清空
+        :return: Main 实例，没有可用的会话时返回None
+        :raise EOFError: 该数据源没有数据
+        """
+        key = (word_mode, number, data_sources_type, study_mode)
+        with self.lock:
+            thread = self._thread if self._key == key else None
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            if self._key != key or self._result is None or self._version != self._current_version():
+                return None
+            result = self._result
+            self._key = self._result = self._version = None
+        if isinstance(result, EOFError):
+            raise result
+        return result
 
 
 if __name__ == '__main__':
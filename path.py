@@ -3,11 +3,20 @@ from pathlib import Path
 
 main = Path(__file__).resolve().parent
 record_json = os.path.join(main, 'records.json')
+record_db = os.path.join(main, 'records.db')
+record_journal = os.path.join(main, 'records.journal')
+record_bin = os.path.join(main, 'records.bin')
+settings_json = os.path.join(main, 'settings.json')
 text_json = os.path.join(main, 'text.json')
+schedule_json = os.path.join(main, 'schedule.json')
 
 word_txt = os.path.join(main, 'word.txt')
+word_index = os.path.join(main, 'word_index_v2.pkl')
+word_index_mmap = os.path.join(main, 'word_index.mwd')
+vocabulary = os.path.join(main, 'vocabulary.mwd')
 today_data = os.path.join(main, 'today_data')
 today_mp3 = os.path.join(today_data, 'today_data_mp3')
 yesterday_mp3 = os.path.join(today_data, 'yesterday_data_mp3')
-last_run_date = os.path.join(today_data, 'last_run_date.txt')
+daily_plan = os.path.join(today_data, 'daily_plan.json')
 Speech = os.path.join(main, 'Speech')
+audio_cache = os.path.join(main, 'AudioCache')
@@ -2,101 +2,136 @@
 程序思想：
 有两个本地语音库，美音库Speech_US，英音库Speech_US
 调用有道api，获取语音MP3，存入对应的语音库中
+下载由 download.Downloader 统一进行：有限的工作线程、持久连接、按主机限速、超时重试
+下载好的发音统一保存在 audio_cache.AudioCache 的打包文件中，按 (单词, 口音) 查找，不再按目录分开保存、定期清空
+朗读由一个常驻的播放线程依次进行，翻到下一张卡片时之前还没播放的单词直接跳过
+AudioPrefetcher 跟随学习游标，保证接下来几张卡片的发音提前下载到缓存，并交给播放后端预先解码
+播放后端可以替换（settings.json 的 "audio_backend"）：playsound 把发音写到临时文件后打开、解码，重复播放时复用文件；
+pcm 使用 miniaudio 把解码后的 PCM 保存在按大小淘汰的 LRU 缓存中，重复播放只需提交缓冲区；
+null 不发声，只记录播放的发音，用于没有声卡的测试和性能测量
 """
-import copy
+import atexit
+import itertools
 import os
+import queue
+import shutil
+import tempfile
 import threading
-import urllib.request
-from playsound import playsound, PlaysoundException
-import path
+import time
+import urllib.parse
+from collections import OrderedDict, deque
+import audio_cache
+import download
+
+try:
+    from playsound import playsound, PlaysoundException
+except ImportError:
+    playsound = None
+    PlaysoundException = Exception
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+# 有道发音接口，可以在 settings.json 的 "pronounce_base_url" 中换成本地的测试服务器
+DEFAULT_BASE_URL = 'http://dict.youdao.com/dictvoice'
+# 播放队列的长度，队列满时丢弃最早的请求
+PLAYBACK_QUEUE_SIZE = 4
+# 保留最近多少次“请求朗读到开始播放”的延迟
+LATENCY_SAMPLES = 100
+# 默认提前准备发音的卡片数（含当前卡片），可以在 settings.json 的 "audio_lookahead" 中修改
+DEFAULT_LOOKAHEAD = 5
+# 播放后端的名称
+BACKEND_PLAYSOUND = "playsound"
+BACKEND_PCM = "pcm"
+BACKEND_NULL = "null"
+# 解码后 PCM 缓存的默认大小：32MB，可以在 settings.json 的 "pcm_cache_bytes" 中修改
+DEFAULT_PCM_BUDGET = 32 * 1024 * 1024
+# PCM 后端统一解码成的格式：16 位、双声道、44.1kHz
+PCM_CHANNELS = 2
+PCM_SAMPLE_RATE = 44100
+PCM_BUFFER_MSEC = 200
+# playsound 只能播放文件，发音数据先写到本进程的临时目录中，最多保留这么多个文件供重复播放
+PLAYSOUND_SCRATCH_FILES = 8
 
 
 class youdao:
-    def __init__(self):
+    def __init__(self, downloader: download.Downloader = None, base_url: str = DEFAULT_BASE_URL,
+                 cache: audio_cache.AudioCache = None):
         """
         调用youdao API
         type = 0：美音
         type = 1：英音
 
-        判断当前目录下是否存在两个语音库的目录
-        如果不存在，创建
+        :param downloader: 共用的下载引擎，默认新建一个
+        :param base_url: 发音接口地址
+        :param cache: 共用的发音缓存，默认使用 path.audio_cache
         """
-        # 文件根目录
-        self._filePath = None
-        self._dirRoot = os.path.dirname(os.path.abspath(__file__))
-        self._dirSpeech = os.path.join(self._dirRoot, 'Speech')  # 美音
-        # 判断是否存在美音库
-        if not os.path.exists('Speech'):
-            # 不存在，就创建
-            os.makedirs('Speech')
+        self.downloader = downloader or download.Downloader()
+        self.base_url = base_url
+        self.cache = cache if cache is not None else audio_cache.AudioCache()
 
-    def down(self, word: str, file_path: str = None):
+    def down(self, word: str):
         """
-        下载单词的MP3
-        判断语音库中是否有对应的MP3
-        如果没有就下载
+        获取单词两种口音的MP3，缓存中没有的立即下载
+        多个线程同时请求同一个文件时只会下载一次，见 download.Downloader；只有发起下载的一方登记到缓存
+        :return: 两种口音的MP3数据
         """
         try:
             word = word.lower()  # 小写
         except AttributeError:
             raise EOFError("非英文", word)
-        tmp = self._getWordMp3FilePath(word)
         temp_list = []
         for i in [0, 1]:
-            if file_path is None:
-                self._filePath = os.path.join(self._dirSpeech, word + str(i) + '.mp3')
-            else:
-                self._filePath = os.path.join(file_path, word + str(i) + '.mp3')
-            if tmp is None:
-                self._getURL(i)  # 组合URL
-                # 调用下载程序，下载到目标文件夹
-                # print('不存在 %s.mp3 文件\n将URL:\n' % word, self._url, '\n下载到:\n', self._filePath)
-                # 下载到目标地址
-                urllib.request.urlretrieve(self._url, filename=self._filePath)
-                print(f'{self._filePath}.mp3 下载完成')
-            else:
-                print(f'已经存在{self._filePath}mp3, 不需要下载')
-            temp_list.append(copy.copy(self._filePath))
-
-        # 返回声音文件路径
+            data = self.cache.get(word, i)
+            if data is None:
+                file_path = self.cache.path_for(word, i)
+                self.downloader.fetch(self.url(word, i), file_path, self._register(word, i, file_path))
+                data = self.cache.get(word, i)
+                if data is None:
+                    # 合并到了其他批次的下载，发起方还没有登记（或登记后已被淘汰），直接读落地文件
+                    try:
+                        with open(file_path, 'rb') as f:
+                            data = f.read()
+                    except FileNotFoundError:
+                        data = self.cache.get(word, i)
+                    if data is None:
+                        raise EOFError(f"{word}{i}.mp3 已从缓存中淘汰")
+            temp_list.append(data)
+
+        # 返回声音数据
         return temp_list
 
-    def _getURL(self, _type: int = 0):
+    def _register(self, word: str, accent: int, file_path: str):
         """
-        私有函数，生成发音的目标URL
-        https://dict.youdao.com/dictvoice?type=0&audio=
+        内部私有方法，生成下载结束后的回调：由本次请求发起的下载登记到缓存
         """
-        # noinspection HttpUrlsUsage
-        self._url = r'http://dict.youdao.com/dictvoice?type=' + str(
-            _type) + r'&audio=' + self._word
+        def register(batch):
+            if file_path in batch.owned and not batch.failed:
+                self.cache.add(word, accent, file_path)
+                print(f'{word}{accent}.mp3 下载完成')
+        return register
 
-    def _getWordMp3FilePath(self, word: str):
+    def url(self, word: str, _type: int = 0):
         """
-        获取单词的MP3本地文件路径
-        如果有MP3文件，返回路径(绝对路径)
-        如果没有，返回None
+        :return: 单词指定口音的发音地址
         """
-        word = word.lower()  # 小写
-        self._word = word
-        self._fileName = self._word + '0.mp3'
-        self._filePath = os.path.join(self._dirSpeech, self._fileName)
+        return f"{self.base_url}?type={_type}&audio={urllib.parse.quote(word.lower())}"
 
-        # 判断是否存在这个MP3文件
-        if os.path.exists(self._filePath):
-            # 存在这个mp3
-            return self._filePath
-        else:
-            # 不存在这个MP3，返回none
-            return None
+    def jobs(self, word: str):
+        """
+        列出单词两种口音中缓存里还没有的文件
+        :param word: 单词
+        :return: (URL, 保存路径, 口音) 列表
+        """
+        return [(self.url(word, i), self.cache.path_for(word, i), i) for i in [0, 1] if (word, i) not in self.cache]
 
     @staticmethod
     def clear_all_files(file_path: str):
         """
-        清除所有下载好的MP3音频
+        清除目录中所有下载好的MP3音频
         """
-        # 遍历美音库和英音库
-
-        # dir_path = os.path.join(self._dirRoot, "Speech")
         if os.path.exists(file_path):
             for root, dirs, files in os.walk(file_path):
                 for file in files:
@@ -106,34 +141,527 @@ class youdao:
                         print(f"已删除文件: {file_path}")
 
 
-class MemorizeWord:
+class AudioError(Exception):
+    """发音数据无法解码或播放（数据损坏），需要删除后重新下载"""
+
+
+class BackendError(Exception):
+    """播放后端不可用（没有安装、无法打开声卡等），与发音数据无关，不删除缓存"""
+
+
+class BufferCache:
+    def __init__(self, budget: int):
+        """
+        按总字节数淘汰的 LRU 缓存：{(单词, 口音): (缓冲区, 字节数)}
+        :param budget: 总字节数上限
+        """
+        self.budget = budget
+        self.total = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, buffer, size: int):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total -= old[1]
+            self._entries[key] = (buffer, size)
+            self.total += size
+            while self.total > self.budget and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total -= evicted
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total -= entry[1]
+
+
+class AudioBackend:
+    name = None
+
     def __init__(self):
-        self.sp = youdao()
+        # 最近的解码耗时和播放调用耗时（秒）
+        self.decode_times = deque(maxlen=LATENCY_SAMPLES)
+        self.play_times = deque(maxlen=LATENCY_SAMPLES)
 
-    def download(self, words: list[str], file_path: str = None):
-        for word in words:
-            self.sp.down(word, file_path)
-        print(f"位于{file_path}所有音频下载完成")
+    def preload(self, key, data: bytes):
+        """
+        预先解码一个发音，之后播放时不必再解码；不支持预先解码的后端什么也不做
+        :param key: (单词, 口音)
+        :param data: MP3 数据
+        :raise AudioError: 无法解码
+        """
 
-    def sing(self, word: str, file_path: str = None):
-        def sing_func(_word: str, _file_path: os.path = None):
-            for _file_path in self.sp.down(_word, _file_path):
-                if os.path.exists(_file_path):
-                    try:
-                        playsound(_file_path)
-                    except PlaysoundException:
-                        print(f"{_file_path}未能正常打开")
-                else:
-                    print(f"文件 {_file_path} 不存在")
+    def play(self, key, data: bytes):
+        """
+        播放一个发音，播放结束后返回
+        :param key: (单词, 口音)
+        :param data: MP3 数据，已经预先解码过的后端不再使用
+        :raise AudioError: 无法解码或播放
+        :raise BackendError: 播放后端不可用
+        """
+        start = time.perf_counter()
+        self._play(key, data)
+        self.play_times.append(time.perf_counter() - start)
+
+    def _play(self, key, data: bytes):
+        raise NotImplementedError
+
+    def discard(self, key):
+        """丢弃一个发音已经解码的数据，例如数据损坏被删除时"""
+
+    def stats(self):
+        """
+        :return: (平均解码毫秒, 平均播放毫秒)
+        """
+        def average(values):
+            values = list(values)
+            return round(sum(values) / len(values) * 1000, 3) if values else 0.0
+
+        return average(self.decode_times), average(self.play_times)
+
+
+class PlaysoundBackend(AudioBackend):
+    name = BACKEND_PLAYSOUND
+
+    def __init__(self):
+        """
+        playsound 只能播放文件：发音数据写到本进程独有的临时目录中，按 (单词, 口音) 保留最近的几个文件，
+        重复播放同一个发音时不再写文件；解码在 playsound 内部完成，只计入播放耗时
+        """
+        super().__init__()
+        self._directory = None
+        # {(单词, 口音): 文件路径}，越靠后越是最近使用的
+        self._files = OrderedDict()
+        self._names = itertools.count()
+
+    def _scratch_file(self, key, data: bytes):
+        """
+        内部私有方法，取出该发音的临时文件，没有时写出，超出数量时删除最久没有使用的
+        """
+        file_path = self._files.get(key)
+        if file_path is not None:
+            self._files.move_to_end(key)
+            return file_path
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='memorize_words_')
+            atexit.register(shutil.rmtree, self._directory, True)
+        while len(self._files) >= PLAYSOUND_SCRATCH_FILES:
+            self._remove_file(self._files.popitem(last=False)[1])
+        file_path = os.path.join(self._directory, f"{next(self._names)}.mp3")
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        self._files[key] = file_path
+        return file_path
+
+    def _play(self, key, data: bytes):
+        if playsound is None:
+            raise BackendError("没有安装 playsound")
+        file_path = self._scratch_file(key, data)
+        try:
+            playsound(file_path)
+        except PlaysoundException as e:
+            raise AudioError(str(e))
+
+    def discard(self, key):
+        file_path = self._files.pop(key, None)
+        if file_path is not None:
+            self._remove_file(file_path)
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            os.remove(file_path)
+        except OSError:
+            # 删除失败的文件在退出时随临时目录一起删除
+            pass
 
+
+class PcmBackend(AudioBackend):
+    name = BACKEND_PCM
+
+    def __init__(self, budget: int = DEFAULT_PCM_BUDGET):
+        """
+        使用 miniaudio 解码和播放，解码结果保存在 BufferCache 中
+        :param budget: 解码后 PCM 缓存的总字节数上限
+        """
+        super().__init__()
+        self.buffers = BufferCache(budget)
+        self._device = None
+
+    def _decode(self, key, data: bytes):
+        """
+        内部私有方法，取出解码后的 PCM，没有时解码并放入缓存
+        """
+        decoded = self.buffers.get(key)
+        if decoded is None:
+            start = time.perf_counter()
+            try:
+                decoded = miniaudio.decode(data, miniaudio.SampleFormat.SIGNED16, PCM_CHANNELS, PCM_SAMPLE_RATE)
+            except miniaudio.MiniaudioError as e:
+                raise AudioError(str(e))
+            self.decode_times.append(time.perf_counter() - start)
+            self.buffers.put(key, decoded, decoded.samples.itemsize * len(decoded.samples))
+        return decoded
+
+    def preload(self, key, data: bytes):
+        self._decode(key, data)
+
+    @staticmethod
+    def _stream(samples, finished: threading.Event):
+        """
+        内部私有方法，按设备每次请求的帧数依次提交缓冲区
+        """
+        required_frames = yield b''
+        offset = 0
+        while offset < len(samples):
+            end = offset + required_frames * PCM_CHANNELS
+            required_frames = yield samples[offset:end]
+            offset = end
+        finished.set()
+
+    def _play(self, key, data: bytes):
+        decoded = self._decode(key, data)
+        finished = threading.Event()
+        stream = self._stream(decoded.samples, finished)
+        next(stream)
         try:
-            thread = threading.Thread(target=sing_func, args=(word, file_path,))
+            if self._device is None:
+                self._device = miniaudio.PlaybackDevice(miniaudio.SampleFormat.SIGNED16, PCM_CHANNELS,
+                                                        PCM_SAMPLE_RATE, buffersize_msec=PCM_BUFFER_MSEC)
+            self._device.start(stream)
+        except miniaudio.MiniaudioError as e:
+            raise BackendError(str(e))
+        # 最后一个缓冲区提交后还要等它播完
+        finished.wait(decoded.duration + 1)
+        time.sleep(PCM_BUFFER_MSEC / 1000)
+        self._device.stop()
+
+    def discard(self, key):
+        self.buffers.discard(key)
+
+
+class NullBackend(AudioBackend):
+    name = BACKEND_NULL
+
+    def __init__(self, budget: int = DEFAULT_PCM_BUDGET):
+        """
+        不发声的后端：预先加载时把数据复制一份放入 BufferCache（代替解码），播放时只记录 ((单词, 口音), 时间)
+        :param budget: 缓存的总字节数上限
+        """
+        super().__init__()
+        self.buffers = BufferCache(budget)
+        self.played = []
+
+    def preload(self, key, data: bytes):
+        if key in self.buffers:
+            return
+        start = time.perf_counter()
+        buffer = bytearray(data)
+        self.decode_times.append(time.perf_counter() - start)
+        self.buffers.put(key, buffer, len(buffer))
+
+    def _play(self, key, data: bytes):
+        if self.buffers.get(key) is None:
+            self.preload(key, data)
+        self.played.append((key, time.perf_counter()))
+
+    def discard(self, key):
+        self.buffers.discard(key)
+
+
+def create_backend(name: str = BACKEND_PLAYSOUND, pcm_budget: int = DEFAULT_PCM_BUDGET):
+    """
+    按名称创建播放后端，pcm 后端需要 miniaudio，没有安装时退回 playsound；playsound 也没有安装时不发声
+    :param name: BACKEND_PLAYSOUND、BACKEND_PCM 或 BACKEND_NULL
+    :param pcm_budget: 解码后 PCM 缓存的总字节数上限
+    :return: AudioBackend
+    """
+    if name == BACKEND_NULL:
+        return NullBackend(pcm_budget)
+    if name == BACKEND_PCM:
+        if miniaudio is not None:
+            return PcmBackend(pcm_budget)
+        print("没有安装 miniaudio，使用 playsound 播放")
+    if playsound is None:
+        print("没有安装 playsound，不播放发音")
+        return NullBackend(pcm_budget)
+    return PlaysoundBackend()
+
+
+class Player:
+    def __init__(self, sp: youdao, backend: AudioBackend = None):
+        """
+        常驻的播放线程：所有朗读请求进入同一个有界队列，由一个线程依次播放
+        每次请求都会使之前的请求过期，过期的请求在开始播放前（以及两种口音之间）被跳过，听到的总是当前卡片
+        没有朗读请求时，空闲的播放线程把预先加载的文件交给后端解码
+        :param sp: 用于获取发音文件的 youdao 实例
+        :param backend: 播放后端，默认为 PlaysoundBackend
+        """
+        self.sp = sp
+        self.backend = backend or PlaysoundBackend()
+        # 等待预先解码的 (单词, 口音)，只保留最近一次 preload 提交的
+        self._preload = deque()
+        self._queue = queue.Queue(PLAYBACK_QUEUE_SIZE)
+        # 最新一次请求的序号，小于它的请求都已过期
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        # 最近的“请求朗读到开始播放”的延迟（秒）
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        # 因过期而跳过的请求数
+        self.skipped = 0
+
+    def play(self, word: str):
+        """
+        请求朗读一个单词，立即返回
+        """
+        with self._lock:
+            self.generation += 1
+            self._put((self.generation, word, time.perf_counter()))
+
+    def preload(self, keys: list):
+        """
+        请求在空闲时预先解码一组发音，替换之前还没处理的请求，立即返回
+        :param keys: (单词, 口音) 列表
+        """
+        with self._lock:
+            self._preload = deque(keys)
+            # 唤醒空闲的播放线程，队列满时说明它马上就会醒来
+            try:
+                self._start()
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _start(self):
+        """
+        内部私有方法，第一次使用时（或播放线程意外退出后）启动播放线程，调用者需持有锁
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._work, name="playback", daemon=True)
+            self._thread.start()
+
+    def _put(self, item):
+        """
+        内部私有方法，把朗读请求放入队列，调用者需持有锁
+        """
+        self._start()
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                # 队列中的请求都已经过期，丢掉最早的一个腾出位置；丢掉的 None 只是 preload 的唤醒标记，不计入跳过数
+                try:
+                    if self._queue.get_nowait() is not None:
+                        self.skipped += 1
+                except queue.Empty:
+                    pass
+
+    def cancel(self):
+        """使所有还没播放的请求过期"""
+        with self._lock:
+            self.generation += 1
+
+    def _current(self, generation: int):
+        return generation == self.generation
 
-        except UnicodeEncodeError:
-            print(f"{word}未能朗读")
+    def _next_preload(self):
+        with self._lock:
+            return self._preload.popleft() if self._preload else None
+
+    def _work(self):
+        while True:
+            # item 为 None 表示只是 preload 唤醒了线程
+            key = None
+            try:
+                item = self._queue.get(block=not self._preload)
+            except queue.Empty:
+                item = None
+                key = self._next_preload()
+            try:
+                if item is not None:
+                    self._play_item(*item)
+                elif key is not None:
+                    self._preload_item(key)
+            except Exception as e:
+                # 播放线程是常驻的，任何意外错误都只影响这一个请求
+                print(f"播放线程出错：{e!r}")
+
+    def _preload_item(self, key):
+        """
+        内部私有方法，没有朗读请求时每次只解码一个发音，然后重新检查队列
+        """
+        data = self.sp.cache.get(*key)
+        if data is not None:
+            try:
+                self.backend.preload(key, data)
+            except (AudioError, BackendError) as e:
+                print(f"{key}未能预先解码：{e}")
+
+    def _play_item(self, generation: int, word: str, requested: float):
+        """
+        内部私有方法，播放一个朗读请求，已经过期时跳过
+        """
+        if not self._current(generation):
+            self.skipped += 1
+            return
+        try:
+            sounds = self.sp.down(word)
+        except (EOFError, download.DownloadError, UnicodeEncodeError) as e:
+            print(f"{word}未能朗读：{e}")
             return
-        # 启动线程
-        thread.start()
+        for i, data in enumerate(sounds):
+            # 下载期间或播放第一种口音时已经翻到了别的卡片
+            if not self._current(generation):
+                self.skipped += 1
+                break
+            if i == 0:
+                self.latencies.append(time.perf_counter() - requested)
+            key = self.sp.cache.key(word, i)
+            try:
+                self.backend.play(key, data)
+            except AudioError:
+                print(f"{word}{i}.mp3未能正常打开")
+                # 数据损坏，删除后下次重新下载
+                self.backend.discard(key)
+                self.sp.cache.discard(word, i)
+            except BackendError as e:
+                # 播放后端的问题，发音数据是好的，保留在缓存中
+                print(f"{word}{i}.mp3未能播放：{e}")
+                break
+
+    def stats(self):
+        """
+        :return: (平均延迟毫秒, 最大延迟毫秒, 跳过的请求数)
+        """
+        latencies = list(self.latencies)
+        if not latencies:
+            return 0.0, 0.0, self.skipped
+        return (round(sum(latencies) / len(latencies) * 1000, 3), round(max(latencies) * 1000, 3),
+                self.skipped)
+
+
+class AudioPrefetcher:
+    def __init__(self, memorize_word, lookahead: int = DEFAULT_LOOKAHEAD):
+        """
+        跟随学习游标预先下载发音：当前卡片最优先，其后的卡片次之，都排在批量预下载之前
+        往回翻或“斩杀”后窗口随游标改变，新窗口中还没下载的单词重新按位置排优先级，已经在下载的不会重复下载
+        :param memorize_word: 共用的 MemorizeWord 实例
+        :param lookahead: 窗口大小（含当前卡片）
+        """
+        self.memorize_word = memorize_word
+        self.lookahead = max(1, lookahead)
+        # 上一次的窗口，游标没有移动时不重复提交
+        self.window = []
+
+    def update(self, words: list[str]):
+        """
+        游标移动后调用
+        :param words: 从游标开始（含当前卡片）的单词，超出窗口的部分忽略
+        :return: 提交下载的单词个数
+        """
+        words = words[:self.lookahead]
+        if words == self.window:
+            return 0
+        self.window = words
+        missing = [word for word in words if not self.memorize_word.is_cached(word)]
+        # 已经缓存的交给播放后端预先解码，其余的下载完成后再预先解码
+        self.memorize_word.preload([word for word in words if word not in missing])
+
+        def preload_downloaded(batch):
+            self.memorize_word.preload([word for word in words if self.memorize_word.is_cached(word)])
+
+        if missing and missing[0] == words[0]:
+            # 当前卡片马上就要朗读
+            self.memorize_word.download(missing[:1], wait=False, priority=download.PRIORITY_URGENT)
+            missing_rest = missing[1:]
+        else:
+            missing_rest = missing
+        if missing_rest:
+            self.memorize_word.download(missing_rest, wait=False, callback=preload_downloaded,
+                                        priority=download.PRIORITY_LOOKAHEAD)
+        return len(missing)
+
+
+class MemorizeWord:
+    def __init__(self, downloader: download.Downloader = None, base_url: str = DEFAULT_BASE_URL,
+                 cache: audio_cache.AudioCache = None, backend: AudioBackend = None):
+        """
+        :param downloader: 共用的下载引擎，默认新建一个
+        :param base_url: 发音接口地址
+        :param cache: 共用的发音缓存，默认使用 path.audio_cache
+        :param backend: 播放后端，默认为 PlaysoundBackend
+        """
+        self.downloader = downloader or download.Downloader()
+        self.cache = cache if cache is not None else audio_cache.AudioCache()
+        self.sp = youdao(self.downloader, base_url, self.cache)
+        self.player = Player(self.sp, backend)
+
+    def download(self, words: list[str], wait: bool = True, callback=None, priority: int = download.PRIORITY_BATCH):
+        """
+        把一批单词的发音作为一个批次提交给下载引擎，缓存中已有的跳过，下载成功的登记到缓存
+        :param words: 单词列表
+        :param wait: 是否等待全部下载结束
+        :param callback: 全部下载结束并登记到缓存后调用 callback(batch)
+        :param priority: 下载优先级，见 download.PRIORITY_*
+        :return: download.Batch
+        """
+        # {保存路径: (单词, 口音)}
+        targets = {}
+        jobs = []
+        for word in words:
+            for url, file_path, accent in self.sp.jobs(word):
+                if file_path not in targets:
+                    targets[file_path] = (word, accent)
+                    jobs.append((url, file_path))
+
+        def register(batch):
+            # 合并到其他请求的文件由发起下载的一方登记
+            for file_path, (word, accent) in targets.items():
+                if file_path in batch.owned and file_path not in batch.failed:
+                    self.cache.add(word, accent, file_path)
+            self.cache.flush()
+            if callback is not None:
+                callback(batch)
+
+        batch = self.downloader.download(jobs, register, priority)
+        if wait:
+            batch.wait()
+            print(f"所有音频下载完成，失败 {len(batch.failed)} 个")
+        return batch
+
+    def is_cached(self, word: str):
+        """
+        :return: 单词两种口音的发音是否都已经缓存，只查内存中的索引
+        """
+        return not self.sp.jobs(word)
+
+    def preload(self, words: list[str]):
+        """
+        让播放后端在空闲时预先解码这些单词已经缓存的发音
+        """
+        self.player.preload([self.cache.key(word, i) for word in words for i in [0, 1] if (word, i) in self.cache])
+
+    def sing(self, word: str):
+        """
+        朗读单词的两种口音，交给常驻的播放线程后立即返回，之前还没播放的单词会被跳过
+        """
+        self.player.play(word)
 
     def clear(self, file_path: str):
         self.sp.clear_all_files(file_path)
@@ -142,4 +670,3 @@ class MemorizeWord:
 if __name__ == "__main__":
     mw = MemorizeWord()
     print(mw.sing("hello"))
-    mw.clear(path.Speech)
@@ -1,7 +1,36 @@
+import atexit
+from array import array
+import bisect
+import contextlib
 import datetime
+import os
+import random
+import sqlite3
+import struct
+import sys
+import threading
+import time
 
+import atomic_file
 import path
 import json
+import settings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 下没有 fcntl，改用 msvcrt 加文件锁
+    fcntl = None
+    import msvcrt
+
+# 脏数据在内存中停留的最长时间（秒），到时由后台定时器统一写盘
+FLUSH_DELAY = 2.0
+# 日志模式下累计多少条操作做一次fsync
+JOURNAL_GROUP_SIZE = 32
+# 日志模式下后台压缩线程的运行间隔（秒）
+COMPACT_INTERVAL = 60.0
+# 每天的单词索引列表在内存中用紧凑的无符号整数数组保存
+WORD_ARRAY_TYPE = 'I'
 
 
 # RecordType类定义了一些数据类型的常量，方便在代码中统一使用
@@ -12,14 +41,279 @@ class RecordType:
     TodayData = "TodayData"
 
 
-# RecordJson类用于处理与JSON文件的读写操作
-class RecordJson:
+record_type_list = [RecordType.Logbook, RecordType.LearnedAlready, RecordType.FullyMastered, RecordType.TodayData]
+
+
+# RecordBackend类定义了可选的存储引擎名称，对应settings.json中的 "record_backend" 设置项
+class RecordBackend:
+    Json = "json"
+    Sqlite = "sqlite"
+    Journal = "journal"
+    Binary = "binary"
+
+
+# ReadWriteLock类是进程内的读写锁：多个读者可以同时持有，写者独占，有写者等待时新的读者让路
+# 写者可重入，持有写锁的线程也可以再获取读锁；持有读锁时不能再申请写锁
+class ReadWriteLock:
     def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer = None
+        self._writer_depth = 0
+        # 每个线程自己持有的读锁层数，用于支持读锁重入
+        self._local = threading.local()
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        depth = getattr(self._local, 'reads', 0)
+        if depth or self._writer == me:
+            self._local.reads = depth + 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.reads = 1
+
+    def read_depth(self):
+        """
+        :return: 当前线程持有的读锁层数
+        """
+        return getattr(self._local, 'reads', 0)
+
+    def release_read(self):
+        self._local.reads -= 1
+        if self._local.reads == 0 and self._writer != threading.get_ident():
+            with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    @contextlib.contextmanager
+    def reading(self):
+        """以读者身份持有锁的上下文管理器"""
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+
+# FileLock类是跨进程的建议性文件锁，多个程序实例写同一个记录文件前先获取它
+class FileLock:
+    def __init__(self, lock_path: str):
+        """
+        :param lock_path: 锁文件路径，不存在时自动创建
+        """
+        self.lock_path = lock_path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重试约10秒后仍拿不到锁会抛出异常，继续等待
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+def compact_data(data: dict):
+    """
+    把 {类型: {日期字符串: [单词索引]}} 中的列表转换成紧凑数组，日期字符串做驻留，相同日期只保留一份
+    :param data: JSON中解析出的记录数据
+    :return: 转换后的新字典
+    """
+    return {data_type: {sys.intern(k): array(WORD_ARRAY_TYPE, v) for k, v in (data_dict or {}).items()}
+            for data_type, data_dict in data.items()}
+
+
+def plain_data(data: dict):
+    """
+    compact_data 的逆操作，把数组转换回列表，用于JSON序列化
+    """
+    return {data_type: {k: v.tolist() for k, v in data_dict.items()} for data_type, data_dict in data.items()}
+
+
+# RecordStorage是各种存储引擎的基类，约定了Record使用的读写接口
+class RecordStorage:
+    # 按 (存储类型, 文件路径) 共享的实例，同一个记录文件在进程内只打开一份
+    _shared_instances = {}
+    _shared_lock = threading.Lock()
+    default_path = None
+    # 每次从磁盘重新加载数据时加一，依赖内存数据的索引据此判断是否需要重建
+    generation = 0
+    # 每次通过Record修改数据时加一，与 generation 一起标识数据的版本
+    changes = 0
+    # 该存储共享的反向索引，由Record在第一次查询时建立
+    reverse_index = None
+
+    @classmethod
+    def shared(cls, file_path: str = None):
+        """
+        获取指定记录文件的共享实例，Record、Main 和 UI 都通过它访问同一份数据
+        :param file_path: 记录文件路径，默认为该存储引擎的 default_path
+        :return: 该文件对应的存储实例
+        """
+        file_path = os.path.abspath(file_path or cls.default_path)
+        with RecordStorage._shared_lock:
+            instance = RecordStorage._shared_instances.get((cls, file_path))
+            if instance is None:
+                instance = cls(file_path)
+                RecordStorage._shared_instances[(cls, file_path)] = instance
+            return instance
+
+    def reading(self):
+        """
+        读取时使用的锁，在它的保护下可以连续读取多次而得到一致的数据；默认与写锁相同
+        """
+        return self.lock
+
+    def read_data_by_type(self, data_type):
+        """读取指定类型的全部数据，返回 {日期字符串: [单词索引]} 字典"""
+        raise NotImplementedError
+
+    def write_data(self, data_type, data_dict: dict):
+        """用data_dict整体替换指定类型的数据"""
+        raise NotImplementedError
+
+    def read_day(self, data_type, date_str: str):
+        """读取指定类型某一天的单词索引列表（副本），没有数据时返回空列表"""
+        raise NotImplementedError
+
+    def write_day(self, data_type, date_str: str, data_list: list):
+        """用data_list替换指定类型某一天的数据"""
+        raise NotImplementedError
+
+    def append(self, data_type, date_str: str, word_index: int):
+        """在指定类型某一天的末尾追加一个单词索引"""
+        raise NotImplementedError
+
+    def read_range(self, data_type, start_str: str = None, end_str: str = None, limit: int = None):
+        """按日期从新到旧读取 [start_str, end_str] 内的单词索引，取够limit个后停止"""
+        raise NotImplementedError
+
+    def flush(self):
+        """把尚未持久化的修改写入磁盘"""
+        raise NotImplementedError
+
+    def close(self):
+        """程序退出前调用：写盘并释放后台线程等资源；默认只写盘"""
+        self.flush()
+
+    def refresh(self):
+        """检查磁盘上的数据是否被外部修改，必要时重新加载；默认什么也不做"""
+
+
+# RecordJson类用于处理与JSON文件的读写操作
+class RecordJson(RecordStorage):
+    default_path = path.record_json
+
+    def __init__(self, file_path: str = None):
         """
         初始化方法，指定要操作的JSON文件路径，默认为record.json
-        这里通过导入的path模块中的text_json来确定文件路径
+        这里通过导入的path模块中的record_json来确定文件路径
+        :param file_path: 记录文件路径，默认为 path.record_json
+        """
+        self.file_path = file_path or path.record_json
+        # 解析后的整份文件数据，只在第一次访问或文件被外部修改后读取
+        self._data = None
+        # 解析时文件的 (修改时间, 大小)，用来判断内存中的快照是否过期
+        self._file_stat = None
+        self._dirty = False
+        self._flush_timer = None
+        # 上次写盘之后的修改操作，写盘前发现文件被其他进程改过时，会在新内容上重放这些操作
+        self._pending = []
+        # {类型: (该类型的字典, 字典长度, 排好序的日期列表)}，字典被替换或日期数变化时重建
+        self._date_index = {}
+        # 读写锁：读取共享，修改内存数据独占；with self.lock 表示独占
+        self.lock = ReadWriteLock()
+        # 同一时刻只允许一个线程写盘
+        self._flush_lock = threading.Lock()
+        # 多个程序实例共用同一个数据目录时，用文件锁串行化写盘
+        self._file_lock = FileLock(self.file_path + '.lock')
+        atexit.register(self.flush)
+
+    def reading(self):
+        """
+        以读者身份持有锁，并保证内存中的数据是最新的
+        """
+        return self._read()
+
+    @contextlib.contextmanager
+    def _read(self):
+        """
+        内部私有方法，以读者身份持有锁并返回最新的内存数据
+        在读锁下检查数据是否过期；过期时释放读锁，在独占锁下重新加载，读锁下从不修改 _data
+        已经持有读锁的线程（嵌套读取）直接使用外层取到的数据
+        """
+        nested = self.lock.read_depth() > 0
+        with self.lock.reading():
+            if self._data is not None and (nested or not self._stale()):
+                yield self._data
+                return
+        with self.lock:
+            self._load()
+            with self.lock.reading():
+                yield self._data
+
+    def _stale(self):
+        """
+        内部私有方法，内存中的数据是否需要重新加载（文件的修改时间或大小发生了变化）
         """
-        self.file_path = path.record_json
+        return self._data is None or self._stat_file() != self._file_stat
+
+    def _stat_file(self):
+        """
+        内部私有方法，获取记录文件的 (修改时间, 大小)，文件不存在时返回None
+        """
+        try:
+            file_stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
 
     def _read_file_data(self):
         """
@@ -37,103 +331,854 @@ class RecordJson:
         except json.JSONDecodeError:
             raise EOFError(f"文件 {self.file_path} 中数据格式有误，无法正确解析")
 
+    def _load(self):
+        """
+        内部私有方法，返回内存中的整份数据，调用者需持有独占锁（with self.lock）
+        只有第一次调用、或者文件的修改时间/大小发生变化（被其他程序改写）时才重新解析，
+        其余情况只做一次 os.stat，不读取文件内容。重新解析后会重放本进程尚未写盘的修改
+        :return: 整个文件数据（字典形式）
+        """
+        file_stat = self._stat_file()
+        if self._data is None or file_stat != self._file_stat:
+            self._reload(file_stat)
+        return self._data
+
+    def _reload(self, file_stat):
+        """
+        内部私有方法，重新解析文件，并在新内容上重放尚未写盘的修改
+        :param file_stat: 解析前取得的文件状态
+        """
+        data = compact_data(self._read_file_data() or {})
+        for op in self._pending:
+            self._apply_op(data, op)
+        self._data = data
+        self._file_stat = file_stat
+        self.generation += 1
+
+    @staticmethod
+    def _apply_op(data: dict, op: dict):
+        """
+        内部私有方法，把一条修改操作应用到内存数据上，每天的数据保存为紧凑数组
+        :param data: 整个记录数据
+        :param op: 修改操作，"op" 为 append/write_day/write_data 之一
+        """
+        type_dict = data.setdefault(op["type"], {})
+        match op["op"]:
+            case "append":
+                type_dict.setdefault(sys.intern(op["date"]), array(WORD_ARRAY_TYPE)).append(op["index"])
+            case "write_day":
+                type_dict[sys.intern(op["date"])] = array(WORD_ARRAY_TYPE, op["list"])
+            case "write_data":
+                data[op["type"]] = {sys.intern(k): array(WORD_ARRAY_TYPE, v) for k, v in op["data"].items()}
+
+    def _commit(self, op: dict):
+        """
+        内部私有方法，应用一条修改操作，记入待写盘列表并安排一次延迟写盘
+        :param op: 修改操作
+        """
+        with self.lock:
+            self._apply_op(self._load(), op)
+            self._pending.append(op)
+            self._mark_dirty()
+
+    def refresh(self):
+        """
+        文件被外部修改（修改时间或大小变化）时重新加载
+        """
+        with self.lock:
+            self._load()
+
+    def read_all(self):
+        """
+        读取整个文件的数据
+        :return: {类型: {日期字符串: [单词索引]}} 字典的副本
+        """
+        with self._read() as data:
+            return {data_type: {k: list(v) for k, v in (data_dict or {}).items()}
+                    for data_type, data_dict in data.items()}
+
     def read_data_by_type(self, data_type):
         """
         根据指定类型读取对应的数据（字典形式）
         :param data_type: 要读取数据的类型标识字符串，合法取值为 "Logbook", "LearnedAlready", "FullyMastered", "TodayData"
-        先调用_read_file_data读取整个文件数据，如果文件数据存在，则从其中获取指定类型的数据并返回，
-        如果不存在该类型数据则返回None
+        数据来自内存中的解析结果，不会重新读取文件。返回的是内存中的字典本身（值为紧凑数组），不要直接修改，
+        需要在 reading() 或 lock 的保护下使用
         :return: 返回指定类型对应的字典数据，如果不存在该类型数据则返回None
         """
-        file_data = self._read_file_data()
-        if file_data:
-            return file_data.get(data_type)
-        return None
+        with self._read() as data:
+            return data.get(data_type)
 
     def write_data(self, data_type, data_dict: dict):
         """
-        将指定类型的数据（字典形式）写入到JSON文件中
+        将指定类型的数据（字典形式）写入内存，并安排一次延迟写盘
         :param data_type: 要写入数据的类型标识字符串，如 "type1"
         :param data_dict: 要写入的对应类型的数据，为字典形式
-        首先读取文件现有数据，如果文件数据不存在则初始化为空字典。然后将指定类型的数据更新到文件数据中，
-        最后尝试将更新后的文件数据写入文件，如果文件不存在会抛出FileNotFoundError异常，
-        如果数据无法进行JSON序列化会抛出TypeError异常
-        """
-        file_data = self._read_file_data()
-        if file_data is None:
-            file_data = {}
-        file_data[data_type] = data_dict
+        数据先更新到内存中并标记为脏数据，由定时器、学习结束或关闭窗口时调用flush统一写入文件
+        """
+        self._commit({"op": "write_data", "type": data_type,
+                      "data": {k: list(v) for k, v in data_dict.items()}})
+
+    def read_day(self, data_type, date_str: str):
+        """
+        读取指定类型某一天的数据
+        :return: 单词索引列表的副本，没有数据时返回空列表
+        """
+        with self._read() as data:
+            return list((data.get(data_type) or {}).get(date_str, []))
+
+    def write_day(self, data_type, date_str: str, data_list: list):
+        """
+        用data_list替换指定类型某一天的数据，并安排一次延迟写盘
+        """
+        self._commit({"op": "write_day", "type": data_type, "date": date_str, "list": list(data_list)})
+
+    def append(self, data_type, date_str: str, word_index: int):
+        """
+        在指定类型某一天的末尾追加一个单词索引，并安排一次延迟写盘
+        """
+        self._commit({"op": "append", "type": data_type, "date": date_str, "index": word_index})
+
+    def read_range(self, data_type, start_str: str = None, end_str: str = None, limit: int = None):
+        """
+        按日期从新到旧读取 [start_str, end_str] 内的数据，同一天内保持原有顺序
+        通过排好序的日期列表二分定位范围，只访问范围内的日期，取够limit个后立即停止
+        :param start_str: 起始日期字符串（含），None表示不限
+        :param end_str: 结束日期字符串（含），None表示不限
+        :param limit: 最多返回的单词个数，None表示不限
+        :return: 单词索引列表
+        """
+        _return = []
+        with self._read() as data:
+            type_dict = data.get(data_type) or {}
+            dates = self._sorted_dates(data_type, type_dict)
+            low = 0 if start_str is None else bisect.bisect_left(dates, start_str)
+            high = len(dates) if end_str is None else bisect.bisect_right(dates, end_str)
+            for position in range(high - 1, low - 1, -1):
+                _return.extend(type_dict[dates[position]])
+                if limit is not None and len(_return) >= limit:
+                    return _return[:limit]
+        return _return
+
+    def _sorted_dates(self, data_type, type_dict: dict):
+        """
+        内部私有方法，返回指定类型排好序的日期列表，只在该类型的字典被替换或新增日期时重新排序
+        """
+        cached = self._date_index.get(data_type)
+        if cached is None or cached[0] is not type_dict or cached[1] != len(type_dict):
+            cached = (type_dict, len(type_dict), sorted(type_dict))
+            self._date_index[data_type] = cached
+        return cached[2]
+
+    def _mark_dirty(self):
+        """
+        内部私有方法，把内存数据标记为脏数据，并在没有定时器时启动一个延迟写盘的定时器
+        """
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """
+        将内存中的脏数据一次性写入JSON文件
+        整个过程持有文件锁：如果文件在上次写盘后被其他进程改过，先重新解析并重放本进程的修改，
+        保证多个进程的修改都不会丢失。序列化和写临时文件时不持有读写锁，读取不会被写盘阻塞；
+        只有最后的 os.replace 在独占锁内完成。如果数据无法进行JSON序列化会抛出EOFError异常
+        """
+        with self._flush_lock, self._file_lock:
+            with self.lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                file_stat = self._stat_file()
+                if file_stat != self._file_stat:
+                    self._reload(file_stat)
+                flushed_count = len(self._pending)
+                # 数组切片是一次内存复制，持锁时间很短
+                snapshot = {data_type: {k: v[:] for k, v in data_dict.items()}
+                            for data_type, data_dict in self._data.items()}
+            temp_path = atomic_file.write_temp(self._serialize(snapshot), self.file_path)
+            with self.lock:
+                atomic_file.replace(temp_path, self.file_path)
+                # 记下自己写出的文件状态，避免下次访问时把自己的写入当成外部修改而重新解析
+                self._file_stat = self._stat_file()
+                del self._pending[:flushed_count]
+                self._dirty = bool(self._pending)
+
+    @staticmethod
+    def _serialize(data: dict):
+        """
+        内部私有方法，把内存数据序列化为要写入文件的内容
+        :return: JSON文本
+        """
         try:
-            with open(self.file_path, 'w') as file:
-                json.dump(file_data, file, indent=4)
-        except FileNotFoundError:
-            raise EOFError(f"文件 {self.file_path} 不存在，无法写入数据")
+            return json.dumps(plain_data(data), indent=4)
         except TypeError:
-            raise EOFError(f"传入的数据 {data_dict} 无法进行JSON序列化，不能写入文件")
+            raise EOFError(f"数据 {data} 无法进行JSON序列化，不能写入文件")
+
+
+# RecordJournal类以追加日志的方式保存记录：每次修改只向日志文件追加一行JSON，
+# 由后台线程定期把日志合并进快照文件，启动时加载快照再重放日志尾部
+class RecordJournal(RecordJson):
+    default_path = path.record_journal
+
+    def __init__(self, file_path: str = None):
+        """
+        :param file_path: 日志文件路径，默认为 path.record_journal，快照文件放在同目录的 *.snapshot.json
+        """
+        super().__init__(file_path or path.record_journal)
+        self.snapshot_path = os.path.splitext(self.file_path)[0] + '.snapshot.json'
+        # 最后一条已写入日志的操作序号，快照中记录了它已经包含到哪个序号；序号在所有进程间连续
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._unsynced = 0
+        self._journal_file = None
+        self._compact_lock = threading.Lock()
+        # 后台压缩线程在第一次加载时启动，close 时停止
+        self._compactor = None
+        self._closed = threading.Event()
+
+    def _stat_files(self):
+        """
+        内部私有方法，获取日志和快照文件的 (inode, 修改时间, 大小)，不存在的文件为None
+        其他进程追加日志或压缩（替换文件）后会发生变化
+        """
+        _return = []
+        for file_path in (self.file_path, self.snapshot_path):
+            try:
+                file_stat = os.stat(file_path)
+                _return.append((file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size))
+            except FileNotFoundError:
+                _return.append(None)
+        return tuple(_return)
+
+    def _stale(self):
+        """
+        内部私有方法，内存中的数据是否需要重新加载：还没加载过，或者日志、快照被其他进程修改过
+        """
+        return self._data is None or self._stat_files() != self._file_stat
+
+    def _load(self):
+        """
+        内部私有方法，返回内存中的整份数据，调用者需持有独占锁
+        第一次调用或日志、快照被其他进程修改后，在文件锁下重新加载
+        :return: 整个记录数据（字典形式）
+        """
+        if self._stale():
+            with self._file_lock:
+                self._replay()
+        return self._data
+
+    def _replay(self):
+        """
+        内部私有方法，加载快照并重放日志中序号更大的操作，调用者需持有独占锁和文件锁
+        快照不存在时以 records.json 作为初始数据；日志最后一行如果只写了一半（写入时崩溃）则截掉
+        """
+        if self._journal_file is not None:
+            if self._unsynced:
+                os.fsync(self._journal_file.fileno())
+            self._journal_file.close()
+            self._journal_file = None
+        self._unsynced = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as file:
+                snapshot = json.load(file)
+            self._data = compact_data(snapshot["data"])
+            self._snapshot_seq = snapshot["seq"]
+        else:
+            self._data = {}
+            self._snapshot_seq = 0
+            if os.path.exists(path.record_json):
+                self._data = compact_data(RecordJson(path.record_json).read_all())
+        self._seq = self._snapshot_seq
+        self.generation += 1
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'rb+') as file:
+                valid_end = 0
+                for line in file:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    valid_end += len(line)
+                    if op["seq"] > self._snapshot_seq:
+                        self._apply_op(self._data, op)
+                        self._seq = op["seq"]
+                # 截掉写了一半的尾行，后续追加的操作才不会和它粘在一起
+                file.truncate(valid_end)
+        self._journal_file = open(self.file_path, 'a')
+        self._file_stat = self._stat_files()
+        if self._compactor is None:
+            self._closed.clear()
+            self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+            self._compactor.start()
+
+    def _commit(self, op: dict):
+        """
+        内部私有方法，在文件锁下应用一条操作并把它追加到日志文件，累计 JOURNAL_GROUP_SIZE 条后做一次fsync
+        追加前先确认没有其他进程修改过日志，保证序号连续、各进程的操作都不会丢失
+        :param op: 不含序号的操作
+        """
+        with self.lock:
+            with self._file_lock:
+                if self._stale():
+                    self._replay()
+                self._apply_op(self._data, op)
+                self._seq += 1
+                op["seq"] = self._seq
+                self._journal_file.write(json.dumps(op, separators=(',', ':')) + '\n')
+                self._journal_file.flush()
+                # 记下自己写出的文件状态，避免把自己的追加当成其他进程的修改
+                self._file_stat = self._stat_files()
+            self._unsynced += 1
+            if self._unsynced >= JOURNAL_GROUP_SIZE:
+                self.flush()
+            else:
+                self._mark_dirty()
+
+    def flush(self):
+        """
+        把已追加但尚未fsync的日志一次性刷到磁盘
+        """
+        with self.lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._journal_file is not None and self._unsynced:
+                os.fsync(self._journal_file.fileno())
+            self._unsynced = 0
+            self._dirty = False
+
+    def close(self):
+        """
+        停止后台压缩线程，刷盘并关闭日志文件；之后再访问会重新加载
+        """
+        with self.lock:
+            self._closed.set()
+            self.flush()
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+            self._data = None
+            self._file_stat = None
+            compactor, self._compactor = self._compactor, None
+        if compactor is not None and compactor is not threading.current_thread():
+            compactor.join()
+
+    def compact(self):
+        """
+        把当前内存数据写成新的快照（原子替换），再从日志中去掉快照已包含的操作
+        持锁时只复制数据，序列化和写快照在锁外进行，期间追加的操作留在日志中；
+        替换时如果发现其他进程已经压缩过，放弃这次压缩
+        快照中记录了已包含的操作序号，即使在清理日志前崩溃，启动时也不会重复应用这些操作
+        """
+        with self._compact_lock:
+            with self.lock:
+                if self._data is None:
+                    return
+                self._load()
+                if self._seq == self._snapshot_seq:
+                    return
+                self.flush()
+                snapshot_seq = self._seq
+                file_stat = self._file_stat
+                # 数组切片是一次内存复制，持锁时间很短
+                snapshot = {data_type: {k: v[:] for k, v in data_dict.items()}
+                            for data_type, data_dict in self._data.items()}
+            temp_path = atomic_file.write_temp(json.dumps({"seq": snapshot_seq, "data": plain_data(snapshot)}),
+                                               self.snapshot_path)
+            with self.lock, self._file_lock:
+                current = self._stat_files()
+                if self._journal_file is None or current[1] != file_stat[1]:
+                    # 已经关闭，或者其他进程替换了快照
+                    os.remove(temp_path)
+                    return
+                atomic_file.replace(temp_path, self.snapshot_path)
+                self._snapshot_seq = snapshot_seq
+                # 只保留快照之后追加的操作（可能来自其他进程），通常只有几行
+                self.flush()
+                self._journal_file.close()
+                with open(self.file_path, 'r') as file:
+                    tail = [line for line in file if json.loads(line)["seq"] > snapshot_seq]
+                atomic_file.write(''.join(tail), self.file_path)
+                self._journal_file = open(self.file_path, 'a')
+                # 期间其他进程追加过日志时保持过期状态，下次访问重新加载
+                self._file_stat = self._stat_files() if current == self._file_stat else None
+
+    def _compact_loop(self):
+        """
+        内部私有方法，后台压缩线程，每隔 COMPACT_INTERVAL 秒压缩一次，close 后退出
+        """
+        while not self._closed.wait(COMPACT_INTERVAL):
+            self.compact()
+
+
+# RecordBinary类与RecordJson的用法完全相同，只是文件采用二进制格式：
+# 每天的单词索引直接以数组的原始字节保存，加载时不需要逐个解析数字
+class RecordBinary(RecordJson):
+    default_path = path.record_bin
+    # 文件头：魔数、格式版本、数组元素字节数、类型个数
+    _header = struct.Struct('<4sHHH')
+    _magic = b'MWRB'
+    _version = 1
+
+    def __init__(self, file_path: str = None):
+        """
+        :param file_path: 二进制记录文件路径，默认为 path.record_bin；文件不存在时从 records.json 导入
+        """
+        super().__init__(file_path or path.record_bin)
+
+    def _read_file_data(self):
+        """
+        内部私有方法，读取二进制记录文件
+        :return: {类型: {日期字符串: 数组}} 字典；文件不存在时返回 records.json 中的数据
+        """
+        if not os.path.exists(self.file_path):
+            return RecordJson(path.record_json).read_all() if os.path.exists(path.record_json) else {}
+        with open(self.file_path, 'rb') as file:
+            content = memoryview(file.read())
+        try:
+            return self._decode(content)
+        except (struct.error, ValueError, IndexError, UnicodeDecodeError):
+            raise EOFError(f"文件 {self.file_path} 已损坏或不完整，无法正确解析")
 
+    def _decode(self, content: memoryview):
+        """
+        内部私有方法，解析二进制记录文件的内容，文件被截断或损坏时抛出 struct.error/ValueError 等异常
+        :return: {类型: {日期字符串: 数组}} 字典
+        """
+        magic, version, item_size, type_count = self._header.unpack_from(content, 0)
+        if magic != self._magic or version != self._version or item_size != array(WORD_ARRAY_TYPE).itemsize:
+            raise EOFError(f"文件 {self.file_path} 不是可识别的二进制记录文件")
+        position = self._header.size
+        data = {}
+        for _ in range(type_count):
+            (name_length,) = struct.unpack_from('<H', content, position)
+            position += 2
+            data_type = bytes(content[position:position + name_length]).decode('utf-8')
+            position += name_length
+            (date_count,) = struct.unpack_from('<I', content, position)
+            position += 4
+            type_dict = data[data_type] = {}
+            for _ in range(date_count):
+                date_length = content[position]
+                position += 1
+                date_str = sys.intern(bytes(content[position:position + date_length]).decode('ascii'))
+                position += date_length
+                (count,) = struct.unpack_from('<I', content, position)
+                position += 4
+                if position + count * item_size > len(content):
+                    raise ValueError("数组超出文件末尾")
+                words = array(WORD_ARRAY_TYPE)
+                words.frombytes(content[position:position + count * item_size])
+                if sys.byteorder == 'big':
+                    words.byteswap()
+                position += count * item_size
+                type_dict[date_str] = words
+        return data
+
+    @staticmethod
+    def _serialize(data: dict):
+        """
+        内部私有方法，把内存数据编码为二进制文件内容，数组按小端字节序原样写出
+        :return: bytes
+        """
+        item_size = array(WORD_ARRAY_TYPE).itemsize
+        parts = [RecordBinary._header.pack(RecordBinary._magic, RecordBinary._version, item_size, len(data))]
+        for data_type, type_dict in data.items():
+            name = data_type.encode('utf-8')
+            parts.append(struct.pack('<H', len(name)) + name + struct.pack('<I', len(type_dict)))
+            for date_str, words in type_dict.items():
+                date_bytes = date_str.encode('ascii')
+                parts.append(struct.pack('<B', len(date_bytes)) + date_bytes + struct.pack('<I', len(words)))
+                if sys.byteorder == 'big':
+                    words = array(WORD_ARRAY_TYPE, words)
+                    words.byteswap()
+                parts.append(words.tobytes())
+        return b''.join(parts)
+
+
+# RecordSqlite类把记录保存在SQLite数据库中，每个单词一行，追加一个单词只需一次带索引的插入
+class RecordSqlite(RecordStorage):
+    default_path = path.record_db
+
+    def __init__(self, file_path: str = None):
+        """
+        打开（必要时创建）SQLite记录数据库
+        数据库第一次创建时，会自动从 records.json 中一次性迁移已有记录
+        :param file_path: 数据库文件路径，默认为 path.record_db
+        """
+        self.file_path = file_path or path.record_db
+        is_new = not os.path.exists(self.file_path)
+        self.lock = threading.RLock()
+        self._connection = sqlite3.connect(self.file_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                date TEXT NOT NULL,
+                word_index INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_records_type_date ON records (type, date);
+            CREATE INDEX IF NOT EXISTS idx_records_word_index ON records (word_index);
+        """)
+        if is_new and os.path.exists(path.record_json):
+            self.migrate_from_json(path.record_json)
+
+    def migrate_from_json(self, json_path: str):
+        """
+        把 records.json 中的全部记录导入数据库，同一天内的顺序保持不变
+        :param json_path: 要导入的JSON记录文件路径
+        """
+        file_data = RecordJson(json_path).read_all()
+        rows = [(data_type, date_str, word_index)
+                for data_type, data_dict in file_data.items() if data_dict
+                for date_str, data_list in data_dict.items()
+                for word_index in data_list]
+        with self.lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM records")
+            self._connection.executemany("INSERT INTO records (type, date, word_index) VALUES (?, ?, ?)", rows)
 
-# Record类作为主要的记录类，封装了对RecordJson类的操作
+    def read_data_by_type(self, data_type):
+        """
+        读取指定类型的全部数据
+        :return: {日期字符串: [单词索引]} 字典，该类型没有数据时返回空字典
+        """
+        data_dict = {}
+        with self.lock:
+            rows = self._connection.execute(
+                "SELECT date, word_index FROM records WHERE type = ? ORDER BY date, id", (data_type,))
+            for date_str, word_index in rows:
+                data_dict.setdefault(date_str, []).append(word_index)
+        return data_dict
+
+    def write_data(self, data_type, data_dict: dict):
+        """
+        用data_dict整体替换指定类型的数据，在一个事务内完成
+        """
+        rows = [(data_type, date_str, word_index)
+                for date_str, data_list in data_dict.items() for word_index in data_list]
+        with self.lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM records WHERE type = ?", (data_type,))
+            self._connection.executemany("INSERT INTO records (type, date, word_index) VALUES (?, ?, ?)", rows)
+
+    def read_day(self, data_type, date_str: str):
+        """
+        读取指定类型某一天的数据，走 (type, date) 索引
+        :return: 单词索引列表，没有数据时返回空列表
+        """
+        with self.lock:
+            rows = self._connection.execute(
+                "SELECT word_index FROM records WHERE type = ? AND date = ? ORDER BY id", (data_type, date_str))
+            return [row[0] for row in rows]
+
+    def write_day(self, data_type, date_str: str, data_list: list):
+        """
+        用data_list替换指定类型某一天的数据，在一个事务内完成
+        """
+        with self.lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM records WHERE type = ? AND date = ?", (data_type, date_str))
+            self._connection.executemany("INSERT INTO records (type, date, word_index) VALUES (?, ?, ?)",
+                                         [(data_type, date_str, word_index) for word_index in data_list])
+
+    def append(self, data_type, date_str: str, word_index: int):
+        """
+        在指定类型某一天的末尾追加一个单词索引，只是一条插入语句
+        """
+        with self.lock:
+            self._connection.execute("INSERT INTO records (type, date, word_index) VALUES (?, ?, ?)",
+                                     (data_type, date_str, word_index))
+
+    def read_range(self, data_type, start_str: str = None, end_str: str = None, limit: int = None):
+        """
+        按日期从新到旧读取 [start_str, end_str] 内的数据，同一天内保持插入顺序
+        在 (type, date) 索引上做一次范围扫描，limit 直接交给 SQLite
+        :return: 单词索引列表
+        """
+        with self.lock:
+            rows = self._connection.execute(
+                "SELECT word_index FROM records WHERE type = ? AND date >= ? AND date <= ? "
+                "ORDER BY date DESC, id LIMIT ?",
+                (data_type, start_str or "", end_str or "9999-12-31", -1 if limit is None else limit))
+            return [row[0] for row in rows]
+
+    def flush(self):
+        """
+        每次修改都已在自己的事务中提交，这里只做一次WAL检查点，把日志合并回数据库文件
+        """
+        with self.lock:
+            self._connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+# ReverseIndex类维护从单词索引到所在类型和日期的反向索引，随Record的修改增量更新，用于判断单词是否已学习
+class ReverseIndex:
+    # 视为“已学习”的类型，NotLearnedYet 会跳过这些单词
+    learned_types = (RecordType.FullyMastered, RecordType.LearnedAlready)
+
+    def __init__(self, storage: RecordStorage):
+        """
+        扫描一遍存储中的全部记录建立索引
+        :param storage: 记录所在的存储引擎
+        """
+        # {单词索引: {类型: {日期字符串: 出现次数}}}
+        self._entries = {}
+        self.generation = storage.generation
+        # 未学习单词池，第一次抽取未学习单词时建立，之后随索引一起增量维护
+        self.pool = None
+        for data_type in record_type_list:
+            for date_str, data_list in (storage.read_data_by_type(data_type) or {}).items():
+                for word_index in data_list:
+                    self.add(data_type, date_str, word_index)
+
+    def add(self, data_type, date_str: str, word_index: int):
+        dates = self._entries.setdefault(word_index, {}).setdefault(data_type, {})
+        dates[date_str] = dates.get(date_str, 0) + 1
+        if self.pool is not None and data_type in self.learned_types:
+            self.pool.discard(word_index)
+
+    def remove(self, data_type, date_str: str, word_index: int):
+        types = self._entries.get(word_index, {})
+        dates = types.get(data_type, {})
+        if date_str not in dates:
+            return
+        dates[date_str] -= 1
+        if dates[date_str] == 0:
+            del dates[date_str]
+            if not dates:
+                del types[data_type]
+                if not types:
+                    del self._entries[word_index]
+                # 单词从已学习类型中彻底移除后重新放回未学习单词池
+                if self.pool is not None and data_type in self.learned_types and not self.is_learned(word_index):
+                    self.pool.add(word_index)
+
+    def is_learned(self, word_index: int):
+        types = self._entries.get(word_index, {})
+        return any(data_type in types for data_type in self.learned_types)
+
+    def unlearned_pool(self, vocabulary_size: int):
+        """
+        获取未学习单词池，单词总数变化时重建
+        :param vocabulary_size: 单词总数，有效索引为 0 ~ vocabulary_size-1
+        :return: UnlearnedPool
+        """
+        if self.pool is None or self.pool.size != vocabulary_size:
+            self.pool = UnlearnedPool(vocabulary_size, [i for i in self._entries if self.is_learned(i)])
+        return self.pool
+
+
+# UnlearnedPool类保存全部未学习单词的索引，用“交换删除”的数组加位置字典实现 O(1) 的加入和移除，
+# 抽取 k 个单词只需 O(k)，与已学习单词的多少无关
+class UnlearnedPool:
+    def __init__(self, size: int, learned):
+        """
+        :param size: 单词总数
+        :param learned: 已学习的单词索引
+        """
+        self.size = size
+        learned = set(learned)
+        self._words = array(WORD_ARRAY_TYPE, (i for i in range(size) if i not in learned))
+        # {单词索引: 在 _words 中的位置}
+        self._position = {word_index: i for i, word_index in enumerate(self._words)}
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word_index):
+        return word_index in self._position
+
+    def add(self, word_index: int):
+        if 0 <= word_index < self.size and word_index not in self._position:
+            self._position[word_index] = len(self._words)
+            self._words.append(word_index)
+
+    def discard(self, word_index: int):
+        # 用末尾的单词填补被移除单词的位置
+        i = self._position.pop(word_index, None)
+        if i is None:
+            return
+        last = self._words.pop()
+        if i < len(self._words):
+            self._words[i] = last
+            self._position[last] = i
+
+    def sample(self, k: int):
+        """
+        不重复地随机抽取单词（部分 Fisher-Yates 洗牌），单词仍留在池中
+        :param k: 抽取个数
+        :return: 单词索引列表，池中不足 k 个时返回全部剩余单词，池空时返回空列表
+        """
+        words, position = self._words, self._position
+        k = min(k, len(words))
+        for i in range(k):
+            j = random.randrange(i, len(words))
+            words[i], words[j] = words[j], words[i]
+            position[words[i]], position[words[j]] = i, j
+        return words[:k].tolist()
+
+
+_storage_classes = {
+    RecordBackend.Json: RecordJson,
+    RecordBackend.Sqlite: RecordSqlite,
+    RecordBackend.Journal: RecordJournal,
+    RecordBackend.Binary: RecordBinary,
+}
+
+
+def default_backend():
+    """
+    读取 settings.json 中的 "record_backend" 设置项，没有设置时使用JSON存储
+    :return: RecordBackend 中的存储引擎名称
+    """
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = settings.Settings(path.settings_json).get("record_backend", RecordBackend.Json)
+    return _default_backend
+
+
+_default_backend = None
+
+
+# Record类作为主要的记录类，封装了对存储引擎（RecordJson/RecordJournal/RecordBinary/RecordSqlite）的操作
 class Record:
-    def __init__(self):
-        # 初始化时创建RecordJson类的实例，用于后续的读写操作
-        self.record_manager = RecordJson()
-        self.logbook = self.record_manager.read_data_by_type(RecordType.Logbook)
-        self.learned_already = self.record_manager.read_data_by_type(RecordType.LearnedAlready)
-        self.fully_mastered = self.record_manager.read_data_by_type(RecordType.FullyMastered)
-        self.today_data = self.record_manager.read_data_by_type(RecordType.TodayData)
+    def __init__(self, backend: str = None):
+        """
+        :param backend: 存储引擎名称，取值见 RecordBackend，默认读取 settings.json 中的设置
+        """
+        # 使用按文件共享的存储实例，多个Record之间共用同一份数据
+        self.record_manager = _storage_classes[backend or default_backend()].shared()
+
+    # 以下属性返回 {日期字符串: [单词索引]} 形式的副本，内部的紧凑数组不会暴露给调用者
+    @property
+    def logbook(self):
+        return self.get(RecordType.Logbook, dic=True)
+
+    @property
+    def learned_already(self):
+        return self.get(RecordType.LearnedAlready, dic=True)
+
+    @property
+    def fully_mastered(self):
+        return self.get(RecordType.FullyMastered, dic=True)
+
+    @property
+    def today_data(self):
+        return self.get(RecordType.TodayData, dic=True)
 
     def get(self, _type: RecordType, _date: datetime.date = None, dic: bool = None):
-        if _date is None:
+        # 返回的都是副本，调用者修改返回值不会影响内存中的记录
+        if _date is not None:
+            # 读取指定类型和日期的数据，如果不存在则返回空列表
+            return self.record_manager.read_day(_type, str(_date))
+        with self.record_manager.reading():
+            data_dic = self.record_manager.read_data_by_type(_type) or {}
+            if dic is not None:
+                return {k: list(v) for k, v in data_dic.items()}
             _return = []
-            # 读取指定类型的所有数据
-            data_dic = self.record_manager.read_data_by_type(_type)
             # 遍历数据字典中的每个键值对，将值扩展到返回列表中
-            if dic is not None:
-                return data_dic
-
             for i in data_dic.values():
                 _return.extend(i)
             return _return
-        try:
-            # 尝试读取指定类型和日期的数据，如果不存在则返回空列表
-            return self.record_manager.read_data_by_type(_type)[str(_date)]
-        except KeyError:
-            return []
+
+    def get_range(self, _type: RecordType, start: datetime.date = None, end: datetime.date = None,
+                  limit: int = None):
+        """
+        获取一段日期内的数据，按日期从新到旧排列，同一天内保持记录顺序
+        :param _type: 数据类型
+        :param start: 起始日期（含），None表示不限
+        :param end: 结束日期（含），None表示不限
+        :param limit: 最多返回的单词个数，取够后立即停止，None表示不限
+        :return: 单词索引列表
+        """
+        return self.record_manager.read_range(_type, None if start is None else str(start),
+                                              None if end is None else str(end), limit)
 
     def write(self, _type, _date: datetime.date, data_list: [int]):
-        # 读取指定类型的现有数据
-        wired = self.record_manager.read_data_by_type(_type)
-        # 创建包含指定日期和数据列表的字典项
-        item = {str(_date): data_list}
-        # 将新的字典项更新到现有数据中
-        wired.update(item)
-        # 将更新后的数据写入文件
-        self.record_manager.write_data(_type, wired)
+        _date_str = str(_date)
+        with self.record_manager.lock:
+            index = self._reverse_index()
+            for word_index in self.record_manager.read_day(_type, _date_str):
+                index.remove(_type, _date_str, word_index)
+            # 用新的列表替换指定日期的数据，稍后统一写盘
+            self.record_manager.write_day(_type, _date_str, data_list)
+            for word_index in data_list:
+                index.add(_type, _date_str, word_index)
+            self.record_manager.changes += 1
 
     def add(self, _type: RecordType, _date: datetime.date, word_index: int):
         assert isinstance(word_index, int)
-        wired = self.record_manager.read_data_by_type(_type)
-        _date_str = str(_date)
-        if _date_str in wired.keys():
-            wired[_date_str].append(word_index)
-        else:
-            wired.update({_date_str: [word_index]})
-        self.record_manager.write_data(_type, wired)
+        with self.record_manager.lock:
+            self._reverse_index().add(_type, str(_date), word_index)
+            self.record_manager.append(_type, str(_date), word_index)
+            self.record_manager.changes += 1
 
     def clear_cache(self):
         """清除TodayData类型中非今日的数据"""
         today = datetime.date.today()
         today_str = str(today)
-        # 读取TodayData数据，若不存在则初始化为空字典
-        today_data = self.record_manager.read_data_by_type(RecordType.TodayData) or {}
-        # 仅保留今日的数据
-        filtered_data = {k: v for k, v in today_data.items() if k == today_str}
-        # 将过滤后的数据写回文件
-        self.record_manager.write_data(RecordType.TodayData, filtered_data)
+        with self.record_manager.lock:
+            index = self._reverse_index()
+            # 读取TodayData数据，若不存在则初始化为空字典
+            today_data = self.record_manager.read_data_by_type(RecordType.TodayData) or {}
+            # 仅保留今日的数据
+            filtered_data = {k: v for k, v in today_data.items() if k == today_str}
+            for date_str, data_list in today_data.items():
+                if date_str != today_str:
+                    for word_index in data_list:
+                        index.remove(RecordType.TodayData, date_str, word_index)
+            # 将过滤后的数据写回内存，稍后统一写盘
+            self.record_manager.write_data(RecordType.TodayData, filtered_data)
+            self.record_manager.changes += 1
+
+    def _reverse_index(self):
+        """
+        内部私有方法，获取存储共享的反向索引，第一次使用或存储从磁盘重新加载后重建
+        调用者需持有 record_manager.lock
+        """
+        storage = self.record_manager
+        storage.refresh()
+        if storage.reverse_index is None or storage.reverse_index.generation != storage.generation:
+            storage.reverse_index = ReverseIndex(storage)
+        return storage.reverse_index
+
+    def version(self):
+        """
+        记录的当前版本，数据被修改或从磁盘重新加载后都会变化，用于判断依赖记录的缓存是否过期
+        :return: (重新加载次数, 修改次数)
+        """
+        with self.record_manager.lock:
+            self.record_manager.refresh()
+            return self.record_manager.generation, self.record_manager.changes
+
+    def sample_unlearned(self, number: int, vocabulary_size: int):
+        """
+        从未学习（既未学习也未完全掌握）的单词中不重复地随机抽取
+        :param number: 抽取个数
+        :param vocabulary_size: 单词总数
+        :return: 单词索引列表，未学习的单词不足时有多少返回多少，全部学完时返回空列表
+        """
+        with self.record_manager.lock:
+            return self._reverse_index().unlearned_pool(vocabulary_size).sample(number)
+
+    def flush(self):
+        """把尚未写盘的记录立即写入文件，在学习结束和关闭窗口时调用"""
+        self.record_manager.flush()
 
+    def close(self):
+        """写盘并停止存储引擎的后台线程，在关闭窗口时调用"""
+        self.record_manager.close()
 
 
 if __name__ == '__main__':
     test = Record()
     test.clear_cache()
+    test.flush()
 
@@ -0,0 +1,332 @@
+"""
+间隔重复调度：按 SM-2 算法为每个单词保存复习间隔、难度系数（ease）、连续答对次数和下次到期日期，
+并维护按到期日期排序的索引，“到期单词个数”和“最先到期的 N 个单词”只需一次二分查找，不需要扫描学习历史。
+
+“斩杀”记为完全记住（QUALITY_PERFECT），“保存”记为没有记住（QUALITY_FORGOT）；
+数据保存在 schedule.json，修改先留在内存中，调用 flush 时以“临时文件 + 重命名”的方式原子地写盘。
+
+到期单词的复习优先级（遗忘概率 + 逾期程度）由 PriorityTable 按列批量计算，只计算到期索引的前缀（已到期的单词），
+安装了 numpy 时一次向量化完成，否则逐个计算；学习时“到期”数据源按优先级从高到低取词。
+"""
+import bisect
+import datetime
+import heapq
+import json
+from array import array
+import os
+import threading
+
+import atomic_file
+import path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# SM-2 的回答质量，0~5，小于3视为没有记住
+QUALITY_PERFECT = 5
+QUALITY_FORGOT = 1
+# ease 的初始值和下限
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# 期望的记忆保持率：单词恰好到期时的回忆概率，用于估算遗忘曲线
+DESIRED_RETENTION = 0.9
+# 到期索引的键为 到期日期序数 << ROW_BITS | 行号
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+
+
+class ScheduleItem:
+    __slots__ = ("interval", "ease", "repetitions", "due")
+
+    def __init__(self, interval: int = 0, ease: float = DEFAULT_EASE, repetitions: int = 0, due: str = None):
+        """
+        :param interval: 当前复习间隔（天）
+        :param ease: 难度系数
+        :param repetitions: 连续记住的次数
+        :param due: 下次到期日期字符串（YYYY-MM-DD）
+        """
+        self.interval = interval
+        self.ease = ease
+        self.repetitions = repetitions
+        self.due = due
+
+    def review(self, quality: int, today: datetime.date):
+        """
+        按 SM-2 算法根据一次回答更新间隔、ease 和到期日期
+        :param quality: 回答质量 0~5
+        :param today: 回答的日期
+        """
+        if quality < 3:
+            self.repetitions = 0
+            self.interval = 1
+        else:
+            self.repetitions += 1
+            if self.repetitions == 1:
+                self.interval = 1
+            elif self.repetitions == 2:
+                self.interval = 6
+            else:
+                self.interval = round(self.interval * self.ease)
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.due = str(today + datetime.timedelta(days=self.interval))
+
+
+# PriorityTable类按列（紧凑数组）保存全部单词的间隔和到期日，用于批量计算复习优先级
+class PriorityTable:
+    def __init__(self):
+        # {单词索引: 行号}，行号一经分配不再改变
+        self.row = {}
+        self.words = array('I')
+        self.interval = array('i')
+        # 到期日期的序数（date.toordinal）
+        self.due = array('i')
+        self.priority = array('d')
+        # 按到期日期排序的索引，键为 到期日期序数 << ROW_BITS | 行号；某一天到期的单词就是它的一个前缀
+        self.by_due = array('q')
+        # 上一次计算时的 (日期序数, 保持率)，参数不变且没有新的回答时不必重算
+        self.computed_for = None
+        # 上一次计算的日期序数和到期前缀的长度，top 只在这个前缀中取词
+        self._computed_day = None
+        self._due_end = 0
+
+    def __len__(self):
+        return len(self.words)
+
+    def update(self, word_index: int, item):
+        """
+        写入一个单词的最新调度状态
+        :param word_index: 单词索引
+        :param item: ScheduleItem
+        """
+        due = datetime.date.fromisoformat(item.due).toordinal()
+        row = self.row.get(word_index)
+        if row is None:
+            row = self.row[word_index] = len(self.words)
+            self.words.append(word_index)
+            self.interval.append(item.interval)
+            self.due.append(due)
+            self.priority.append(0.0)
+        else:
+            old = self.due[row] << ROW_BITS | row
+            del self.by_due[bisect.bisect_left(self.by_due, old)]
+            self.interval[row] = item.interval
+            self.due[row] = due
+            # 到期日期变了，旧的优先级作废，仍然到期时下次计算会重新写入
+            self.priority[row] = 0.0
+        bisect.insort(self.by_due, due << ROW_BITS | row)
+        self.computed_for = None
+
+    def due_end(self, today_ordinal: int):
+        """
+        :param today_ordinal: 日期序数
+        :return: 到期索引中到期日期不晚于该日期的前缀长度，即到期单词的个数
+        """
+        return bisect.bisect_left(self.by_due, (today_ordinal + 1) << ROW_BITS)
+
+    def earliest(self, number: int, today_ordinal: int):
+        """
+        :param number: 最多返回的单词个数
+        :param today_ordinal: 日期序数
+        :return: 最先到期的单词索引列表，按到期日期从早到晚排列
+        """
+        end = min(number, self.due_end(today_ordinal))
+        return [self.words[key & ROW_MASK] for key in self.by_due[:end]]
+
+    def recompute(self, today: datetime.date, retention: float = DESIRED_RETENTION):
+        """
+        重新计算到期单词（到期索引的前缀）的优先级，只写回数值发生变化的行
+        遗忘概率 1 - R，其中 R = retention ^ (距上次复习的天数 / 间隔)，恰好到期时 R 等于 retention；
+        逾期程度为逾期天数 / 间隔；未到期单词的优先级为0
+        :param today: 计算的日期
+        :param retention: 期望的记忆保持率
+        :return: 优先级发生变化的行数
+        """
+        key = (today.toordinal(), retention)
+        if self.computed_for == key:
+            return 0
+        today_ordinal = key[0]
+        changed = 0
+        if self._computed_day is not None and today_ordinal < self._computed_day:
+            # 日期倒退时原来到期的单词可能不再到期，清零后只重算新的前缀
+            changed = sum(1 for value in self.priority if value)
+            self.priority = array('d', bytes(len(self.priority) * self.priority.itemsize))
+        end = self._due_end = self.due_end(today_ordinal)
+        if end and np is not None:
+            # 直接在紧凑数组的缓冲区上建立视图，不复制数据；视图只在本函数内存在，之后数组仍可追加
+            rows = np.frombuffer(self.by_due, dtype=self.by_due.typecode, count=end) & ROW_MASK
+            interval = np.maximum(np.frombuffer(self.interval, dtype=self.interval.typecode)[rows], 1)
+            due = np.frombuffer(self.due, dtype=self.due.typecode)[rows]
+            stored = np.frombuffer(self.priority, dtype=self.priority.typecode)
+            retrievability = np.power(retention, (today_ordinal - (due - interval)) / interval)
+            priority = 1 - retrievability + (today_ordinal - due) / interval
+            differs = priority != stored[rows]
+            stored[rows[differs]] = priority[differs]
+            changed += int(np.count_nonzero(differs))
+            del stored
+        else:
+            for entry in self.by_due[:end]:
+                row = entry & ROW_MASK
+                interval = max(self.interval[row], 1)
+                due = self.due[row]
+                retrievability = retention ** ((today_ordinal - (due - interval)) / interval)
+                priority = 1 - retrievability + (today_ordinal - due) / interval
+                if priority != self.priority[row]:
+                    self.priority[row] = priority
+                    changed += 1
+        self.computed_for = key
+        self._computed_day = today_ordinal
+        return changed
+
+    def top(self, number: int):
+        """
+        按优先级从高到低取到期单词，只在上一次 recompute 的到期前缀中查找，需先调用 recompute
+        :param number: 最多返回的单词个数
+        :return: 单词索引列表
+        """
+        end = self._due_end
+        if np is not None and end and number > 0:
+            candidates = np.frombuffer(self.by_due, dtype=self.by_due.typecode, count=end) & ROW_MASK
+            priority = np.frombuffer(self.priority, dtype=self.priority.typecode)[candidates]
+            candidates, priority = candidates[priority > 0], priority[priority > 0]
+            if len(candidates) > number:
+                keep = np.argpartition(-priority, number - 1)[:number]
+                candidates, priority = candidates[keep], priority[keep]
+            rows = candidates[np.argsort(-priority, kind='stable')].tolist()
+            del candidates, priority
+        else:
+            rows = heapq.nlargest(number, (row for row in (entry & ROW_MASK for entry in self.by_due[:end])
+                                           if self.priority[row] > 0), key=self.priority.__getitem__)
+        return [self.words[row] for row in rows]
+
+
+class Scheduler:
+    _shared_instances = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, file_path: str = None):
+        """
+        :param file_path: 调度数据文件，默认为 path.schedule_json
+        """
+        self.file_path = file_path or path.schedule_json
+        self.lock = threading.RLock()
+        # {单词索引: ScheduleItem}
+        self._items = {}
+        # 按列保存的优先级表，与 _items 同步更新
+        self._table = PriorityTable()
+        # 期望的记忆保持率，UI 启动时从 settings.json 的 "desired_retention" 读取
+        self.retention = DESIRED_RETENTION
+        self._dirty = False
+        # 每次回答后加一，用于判断依赖调度数据的缓存是否过期
+        self.version = 0
+        self._load()
+
+    @classmethod
+    def shared(cls, file_path: str = None):
+        """
+        获取指定文件的共享实例，Main 和 UI 通过它访问同一份调度数据
+        :param file_path: 调度数据文件，默认为 path.schedule_json
+        """
+        file_path = os.path.abspath(file_path or path.schedule_json)
+        with cls._shared_lock:
+            instance = cls._shared_instances.get(file_path)
+            if instance is None:
+                instance = cls._shared_instances[file_path] = cls(file_path)
+            return instance
+
+    def _load(self):
+        """
+        内部私有方法，读取调度数据文件并建立优先级表
+        文件格式：{"单词索引": [间隔, ease, 连续记住次数, 到期日期]}
+        """
+        try:
+            with open(self.file_path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+        except json.JSONDecodeError:
+            raise EOFError(f"调度文件 {self.file_path} 的格式错误，无法解析")
+        self._items = {int(word_index): ScheduleItem(*values) for word_index, values in data.items()}
+        for word_index, item in self._items.items():
+            self._table.update(word_index, item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, word_index):
+        return word_index in self._items
+
+    def get(self, word_index: int):
+        """
+        :return: 单词的 ScheduleItem，尚未调度过时返回None
+        """
+        return self._items.get(word_index)
+
+    def review(self, word_index: int, quality: int, today: datetime.date = None):
+        """
+        记录一次回答并重新调度该单词
+        :param word_index: 单词索引
+        :param quality: 回答质量 0~5，见 QUALITY_PERFECT / QUALITY_FORGOT
+        :param today: 回答的日期，默认为今天
+        :return: 更新后的 ScheduleItem
+        """
+        with self.lock:
+            item = self._items.setdefault(word_index, ScheduleItem())
+            item.review(quality, today or datetime.date.today())
+            self._table.update(word_index, item)
+            self._dirty = True
+            self.version += 1
+            return item
+
+    def due(self, number: int, today: datetime.date = None):
+        """
+        获取最先到期（到期日期不晚于今天）的单词，按到期日期从早到晚排列，直接取到期索引的前缀
+        :param number: 最多返回的单词个数
+        :param today: 判断到期的日期，默认为今天
+        :return: 单词索引列表
+        """
+        with self.lock:
+            return self._table.earliest(number, (today or datetime.date.today()).toordinal())
+
+    def recompute_priorities(self, today: datetime.date = None):
+        """
+        在日期变化或 retention 设置变化后批量重算到期单词的复习优先级
+        :param today: 计算的日期，默认为今天
+        :return: 优先级发生变化的单词个数
+        """
+        with self.lock:
+            return self._table.recompute(today or datetime.date.today(), self.retention)
+
+    def prioritized(self, number: int, today: datetime.date = None):
+        """
+        获取优先级最高的到期单词，日期、设置或调度状态变化后会先重算优先级
+        :param number: 最多返回的单词个数
+        :param today: 判断到期的日期，默认为今天
+        :return: 单词索引列表，按优先级从高到低排列
+        """
+        with self.lock:
+            self._table.recompute(today or datetime.date.today(), self.retention)
+            return self._table.top(number)
+
+    def due_count(self, today: datetime.date = None):
+        """
+        :return: 到期单词的个数
+        """
+        with self.lock:
+            return self._table.due_end((today or datetime.date.today()).toordinal())
+
+    def flush(self):
+        """把调度数据写入文件，没有修改时不写"""
+        with self.lock:
+            if not self._dirty:
+                return
+            text = json.dumps({str(word_index): [item.interval, round(item.ease, 4), item.repetitions, item.due]
+                               for word_index, item in self._items.items()})
+            atomic_file.write(text, self.file_path)
+            self._dirty = False
+
+
+if __name__ == '__main__':
+    scheduler = Scheduler()
+    print(f"共 {len(scheduler)} 个单词参与调度，今天到期 {scheduler.due_count()} 个")
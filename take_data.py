@@ -1,5 +1,13 @@
+import os
 import pickle
+import threading
 import path
+import word_index
+
+# 已经打开的单词表，单词表文件没有变化时所有调用方共用同一个实例
+_dictionary = None
+_dictionary_key = None
+_dictionary_lock = threading.Lock()
 
 
 class WordDictionary:
@@ -8,6 +16,20 @@ class WordDictionary:
             data = pickle.load(f)
             self._word_dict = data["dict_data"]  # 原始字典
             self._index_list = data["index_list"]  # 排序索引列表
+            # 单词 -> 位置 的反向映射，索引文件中自带时直接使用，否则加载时构建一次
+            self._position = data.get("position_dict") or self.build_position_dict(self._index_list)
+
+    @staticmethod
+    def build_position_dict(index_list):
+        """
+        构建 单词 -> 位置 的映射，同时收录单词的小写形式（不覆盖已有的原词），用于兼容大小写的查找
+        :param index_list: 排序索引列表
+        :return: 映射字典
+        """
+        position = {word: i for i, word in enumerate(index_list)}
+        for i, word in enumerate(index_list):
+            position.setdefault(word.lower(), i)
+        return position
 
     def get_data_by_index(self, index):
         """
@@ -20,23 +42,36 @@ class WordDictionary:
             return word, self._word_dict.get(word)
         return None
 
+    def __len__(self):
+        return len(self._index_list)
+
+    def get_field(self, index, field):
+        """
+        获取指定词条的一个字段，调用者负责保证索引有效
+        :return: 字段值，词条没有该字段时返回None
+        """
+        word = self._index_list[index]
+        if field == "word":
+            return word
+        return self._word_dict[word].get(field)
+
     def get_data_by_word(self, word):
         """
         通过单词获取数据 (兼容大小写)
         :return: 数据字典 或 None
         """
-        return self._word_dict.get(word.lower())
+        data = self._word_dict.get(word)
+        return data if data is not None else self._word_dict.get(word.lower())
 
     def get_index_by_word(self, word):
         """
         获取单词在索引列表中的位置
         :return: (索引位置, 总词数) 或 (-1, 总词数)
         """
-        target = word.lower()
-        try:
-            return self._index_list.index(target), len(self._index_list)
-        except ValueError:
-            return -1, len(self._index_list)
+        index = self._position.get(word)
+        if index is None:
+            index = self._position.get(word.lower(), -1)
+        return index, len(self._index_list)
 
 
 class WordData:
@@ -54,9 +89,40 @@ class WordData:
         # "cloze": "acci-den-t[al]", "options": "[\"el|le|nl|ol\"]", "tips": "[[\"t[al]\"", "word_etyma": ""}
 
 
+def open_dictionary():
+    """
+    打开当前可用的单词表：优先使用 vocabulary.py 编译的合并单词表，其次是 word_index.py 转换的内存映射单词表，
+    最后才是 pickle 单词表。内存映射格式启动时不需要反序列化整个单词表
+    打开后缓存在模块中，文件没有变化（路径、大小、修改时间相同）时直接返回缓存的实例
+    :return: WordDictionary 或 word_index.MappedWordDictionary
+    """
+    global _dictionary, _dictionary_key
+    for index_file in (path.vocabulary, path.word_index_mmap, path.word_index):
+        if os.path.exists(index_file):
+            break
+    stat = os.stat(index_file)
+    key = (index_file, stat.st_size, stat.st_mtime_ns)
+    with _dictionary_lock:
+        if _dictionary is None or _dictionary_key != key:
+            if index_file == path.word_index:
+                _dictionary = WordDictionary(index_file)
+            else:
+                _dictionary = word_index.MappedWordDictionary(index_file)
+            _dictionary_key = key
+        return _dictionary
+
+
+def vocabulary_size():
+    """
+    单词总数，即有效单词索引的上界；单词表只在第一次（或文件变化后）打开
+    :return: 单词个数
+    """
+    return len(open_dictionary())
+
+
 class WordListManager:
     def __init__(self):
-        self.pickle = WordDictionary(path.word_index)
+        self.dictionary = open_dictionary()
         """
         self.index_list = []
         with open(path.word_txt, "r", encoding="utf-8") as f:
@@ -69,8 +135,40 @@ class WordListManager:
             index += 1"""
 
     def get_data_by_index(self, index: int):
-        word, data = self.pickle.get_data_by_index(index)
-        return WordData(self.pickle.get_index_by_word(data["word"])[0], word, data["mean_cn"])
+        word, data = self.dictionary.get_data_by_index(index)
+        return WordData(index, word, data.get("mean_cn"))
+
+    def get_data_by_indices(self, indices, fields=("word", "mean_cn")):
+        """
+        批量获取多个单词的指定字段，按列返回
+        重复出现的索引只查询一次；超出范围的索引（如记录来自更大的单词表）不影响其他单词，对应位置为None
+        :param indices: 单词索引序列
+        :param fields: 要获取的字段名
+        :return: 与fields一一对应的列表元组，每个列表与indices等长、顺序一致
+        """
+        size = len(self.dictionary)
+        missing = (None,) * len(fields)
+        rows = {}
+        for index in indices:
+            if index not in rows:
+                if 0 <= index < size:
+                    rows[index] = tuple(self.dictionary.get_field(index, field) for field in fields)
+                else:
+                    rows[index] = missing
+        bad = [index for index, row in rows.items() if row is missing]
+        if bad:
+            print(f"单词索引超出范围 0~{size - 1}，已跳过：{bad}")
+        return tuple([rows[index][column] for index in indices] for column in range(len(fields)))
+
+    def get_data_by_word(self, word: str):
+        """
+        通过单词获取数据
+        :return: WordData 或 None（单词不在单词表中）
+        """
+        index = self.get_index_by_word(word)
+        if index == -1:
+            return None
+        return self.get_data_by_index(index)
 
     def get_index_by_word(self, word: str):
         """try:
@@ -82,7 +180,7 @@ class WordListManager:
                 except ValueError:
                     print("word not found：", word)
                     return None"""
-        return self.pickle.get_index_by_word(word)[0]
+        return self.dictionary.get_index_by_word(word)[0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import audio_pack
+
+
+class AudioPackTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.pack_path = os.path.join(self.directory, 'audio.pack')
+
+    def open_pack(self):
+        pack = audio_pack.AudioPack(self.pack_path)
+        self.addCleanup(pack.close)
+        return pack
+
+    def fill(self):
+        pack = audio_pack.AudioPack(self.pack_path)
+        pack.add('apple', 0, b'apple-uk')
+        pack.add('Apple', 1, b'apple-us')
+        pack.add('café', 0, b'cafe' * 100)
+        pack.close()
+
+    def test_round_trip(self):
+        self.fill()
+        pack = self.open_pack()
+        self.assertEqual(len(pack), 3)
+        self.assertIn(('APPLE', 1), pack)
+        self.assertEqual(pack.get('apple', 0), b'apple-uk')
+        self.assertEqual(pack.get('apple', 1), b'apple-us')
+        self.assertEqual(pack.get('café', 0), b'cafe' * 100)
+        self.assertIsNone(pack.get('apple', 2))
+        self.assertEqual(pack.garbage, 0)
+
+    def test_rescans_without_index(self):
+        self.fill()
+        os.remove(self.pack_path + audio_pack.INDEX_SUFFIX)
+        pack = self.open_pack()
+        self.assertEqual(sorted(pack.keys()), [('apple', 0), ('apple', 1), ('café', 0)])
+        self.assertEqual(pack.get('café', 0), b'cafe' * 100)
+
+    def test_truncates_torn_record(self):
+        self.fill()
+        size = os.path.getsize(self.pack_path)
+        with open(self.pack_path, 'ab') as f:
+            f.write(audio_pack.RECORD.pack(4, 0, 1000, 0) + b'pear' + b'half')
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            pack = self.open_pack()
+        self.assertIn('不完整的记录', output.getvalue())
+        self.assertEqual(len(pack), 3)
+        self.assertEqual(pack.size, size)
+        self.assertEqual(os.path.getsize(self.pack_path), size)
+        pack.add('pear', 0, b'pear-uk')
+        pack.close()
+        self.assertEqual(self.open_pack().get('pear', 0), b'pear-uk')
+
+    def test_verify_detects_corruption(self):
+        self.fill()
+        pack = audio_pack.AudioPack(self.pack_path)
+        offset, length, _ = pack._index[('apple', 1)]
+        pack.close()
+        with open(self.pack_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(b'X')
+        pack = self.open_pack()
+        self.assertEqual(pack.verify(), [('apple', 1)])
+        self.assertIn(('apple', 1), pack)
+        self.assertEqual(pack.verify(repair=True), [('apple', 1)])
+        self.assertNotIn(('apple', 1), pack)
+        self.assertEqual(pack.verify(), [])
+
+    def test_compact_drops_garbage(self):
+        self.fill()
+        pack = self.open_pack()
+        pack.add('apple', 0, b'apple-uk-2')
+        pack.remove('café', 0)
+        # 被替换和删除的两条记录（含记录头）都是垃圾
+        dead = [(b'apple', b'apple-uk'), ('café'.encode(), b'cafe' * 100)]
+        self.assertEqual(pack.garbage, sum(audio_pack.RECORD.size + len(word) + len(data) for word, data in dead))
+        reclaimed = pack.compact()
+        self.assertGreater(reclaimed, 400)
+        self.assertEqual(pack.garbage, 0)
+        self.assertEqual(pack.size, os.path.getsize(self.pack_path))
+        self.assertEqual(pack.get('apple', 0), b'apple-uk-2')
+        self.assertEqual(pack.get('apple', 1), b'apple-us')
+        self.assertEqual(pack.verify(), [])
+        pack.add('pear', 1, b'pear-us')
+        pack.close()
+        reopened = self.open_pack()
+        self.assertEqual(sorted(reopened.keys()), [('apple', 0), ('apple', 1), ('pear', 1)])
+        self.assertEqual(reopened.get('pear', 1), b'pear-us')
+
+    def test_rejects_foreign_file(self):
+        with open(self.pack_path, 'wb') as f:
+            f.write(b'ID3\x03\x00')
+        with self.assertRaises(audio_pack.PackError):
+            audio_pack.AudioPack(self.pack_path)
+
+    def test_import_directory(self):
+        legacy = os.path.join(self.directory, 'Speech')
+        os.mkdir(legacy)
+        for name, data in (('apple0.mp3', b'a0'), ('apple1.mp3', b'a1'), ('notes.txt', b'x')):
+            with open(os.path.join(legacy, name), 'wb') as f:
+                f.write(data)
+        pack = self.open_pack()
+        self.assertEqual(sorted(pack.import_directory(legacy)), [('apple', 0), ('apple', 1)])
+        self.assertEqual(pack.import_directory(legacy), [])
+        self.assertEqual(pack.get('apple', 1), b'a1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import download
+
+
+# 本地测试服务器：支持 keep-alive，记录每个请求的路径和建立的连接数
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            count = self.server.requests.count(self.path)
+        if self.path.startswith('/slow/'):
+            time.sleep(0.2)
+        if self.path.startswith('/flaky/') and count <= 2 or self.path == '/busy':
+            self.reply(503, b'busy')
+        elif self.path == '/missing':
+            self.reply(404, b'missing')
+        elif self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/ok/target')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.reply(200, self.path.encode())
+
+    def reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        # 重试时不等待
+        patcher = mock.patch.object(download, 'BACKOFF', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def url(self, target: str):
+        return f'http://127.0.0.1:{self.server.server_address[1]}{target}'
+
+    def file(self, name: str):
+        return os.path.join(self.directory, name)
+
+    def read(self, name: str):
+        with open(self.file(name), 'rb') as file:
+            return file.read()
+
+    def test_batch_reuses_connections(self):
+        downloader = download.Downloader(workers=2)
+        done = []
+        jobs = [(self.url(f'/ok/{i}'), self.file(f'sub/{i}.mp3')) for i in range(20)]
+        batch = downloader.download(jobs, done.append)
+        self.assertTrue(batch.wait(10))
+        self.assertTrue(batch.ok)
+        self.assertEqual(done, [batch])
+        for i in range(20):
+            self.assertEqual(self.read(f'sub/{i}.mp3'), f'/ok/{i}'.encode())
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_retries_temporary_errors(self):
+        downloader = download.Downloader(workers=1, retries=3)
+        downloader.fetch(self.url('/flaky/a'), self.file('a.mp3'))
+        self.assertEqual(self.read('a.mp3'), b'/flaky/a')
+        self.assertEqual(self.server.requests.count('/flaky/a'), 3)
+
+    def test_gives_up_after_retries(self):
+        downloader = download.Downloader(workers=1, retries=2)
+        with self.assertRaises(download.DownloadError):
+            downloader.fetch(self.url('/busy'), self.file('busy.mp3'))
+        self.assertEqual(self.server.requests.count('/busy'), 3)
+        self.assertFalse(os.path.exists(self.file('busy.mp3')))
+
+    def test_does_not_retry_client_errors(self):
+        downloader = download.Downloader(workers=1, retries=3)
+        batch = downloader.download([(self.url('/missing'), self.file('missing.mp3')),
+                                     (self.url('/ok/b'), self.file('b.mp3'))])
+        self.assertTrue(batch.wait(10))
+        self.assertEqual(list(batch.failed), [self.file('missing.mp3')])
+        self.assertEqual(self.server.requests.count('/missing'), 1)
+        self.assertEqual(self.read('b.mp3'), b'/ok/b')
+
+    def test_follows_redirects(self):
+        downloader = download.Downloader(workers=1)
+        downloader.fetch(self.url('/redirect'), self.file('r.mp3'))
+        self.assertEqual(self.read('r.mp3'), b'/ok/target')
+
+    def test_concurrent_requests_share_one_download(self):
+        downloader = download.Downloader(workers=4)
+        batches = []
+        threads = [threading.Thread(target=lambda: batches.append(
+            downloader.fetch(self.url('/slow/s'), self.file('s.mp3')))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests.count('/slow/s'), 1)
+        self.assertEqual(downloader.deduplicated, 3)
+        self.assertEqual(sum(bool(batch.owned) for batch in batches), 1)
+        self.assertEqual(self.read('s.mp3'), b'/slow/s')
+
+    def test_urgent_request_jumps_queue(self):
+        downloader = download.Downloader(workers=1)
+        batch = downloader.download([(self.url(f'/slow/{i}'), self.file(f'{i}.mp3')) for i in range(4)])
+        downloader.fetch(self.url('/ok/urgent'), self.file('urgent.mp3'))
+        batch.wait(10)
+        # 工作线程可能已经取走了第一个任务，紧急任务排在其余排队任务之前
+        self.assertLessEqual(self.server.requests.index('/ok/urgent'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import threading
+import unittest
+from unittest import mock
+
+import main
+from main import DataSourcesType, StudyMode, WordMode
+
+
+# 代替 Record 和 Scheduler，只提供 SessionPrefetcher 判断会话是否过期所需的版本号
+class FakeRecorder:
+    def __init__(self):
+        self.changes = 0
+
+    def version(self):
+        return 0, self.changes
+
+
+class FakeScheduler:
+    version = 0
+
+
+# SessionPrefetcher：后台构建、按选择取出、过期丢弃
+class SessionPrefetcherTest(unittest.TestCase):
+    key = (WordMode.E_to_C, 10, DataSourcesType.Learned, StudyMode.Review)
+    other_key = (WordMode.C_to_E, 10, DataSourcesType.Learned, StudyMode.Review)
+
+    def setUp(self):
+        self.recorder = FakeRecorder()
+        self.prefetcher = main.SessionPrefetcher(self.recorder, FakeScheduler())
+        # 构建放行前一直阻塞，用来模拟用户在构建过程中改变选择
+        self.gate = threading.Event()
+        self.gate.set()
+        self.built = []
+        patcher = mock.patch.object(main, 'Main', self.fake_main)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_main(self, *key, recorder, scheduler):
+        self.gate.wait()
+        if key[2] == DataSourcesType.FullyMastered:
+            raise EOFError("没有数据！")
+        self.built.append(key)
+        return key
+
+    def test_take_returns_prefetched_session_once(self):
+        self.prefetcher.request(*self.key)
+        self.assertEqual(self.prefetcher.take(*self.key), self.key)
+        self.assertIsNone(self.prefetcher.take(*self.key))
+
+    def test_same_request_builds_once(self):
+        self.gate.clear()
+        self.prefetcher.request(*self.key)
+        self.prefetcher.request(*self.key)
+        self.gate.set()
+        self.assertEqual(self.prefetcher.take(*self.key), self.key)
+        self.assertEqual(self.built, [self.key])
+
+    def test_other_selection_is_not_returned(self):
+        self.prefetcher.request(*self.key)
+        self.assertIsNone(self.prefetcher.take(*self.other_key))
+
+    def test_changed_selection_discards_running_build(self):
+        self.gate.clear()
+        self.prefetcher.request(*self.key)
+        self.prefetcher.request(*self.other_key)
+        self.gate.set()
+        self.assertIsNone(self.prefetcher.take(*self.key))
+        self.prefetcher.request(*self.other_key)
+        self.assertEqual(self.prefetcher.take(*self.other_key), self.other_key)
+
+    def test_record_change_expires_session(self):
+        self.gate.clear()
+        self.prefetcher.request(*self.key)
+        thread = self.prefetcher._thread
+        self.gate.set()
+        thread.join()
+        self.recorder.changes += 1
+        self.assertIsNone(self.prefetcher.take(*self.key))
+        self.prefetcher.request(*self.key)
+        self.assertEqual(self.prefetcher.take(*self.key), self.key)
+        self.assertEqual(len(self.built), 2)
+
+    def test_empty_source_raises_on_take(self):
+        key = (WordMode.E_to_C, 10, DataSourcesType.FullyMastered, StudyMode.Review_Fully_Grasp)
+        self.prefetcher.request(*key)
+        with self.assertRaises(EOFError):
+            self.prefetcher.take(*key)
+
+
+# Session：按需抽取、游标移动、删除当前卡片和追加
+class SessionTest(unittest.TestCase):
+    def test_draws_lazily_without_repeats(self):
+        session = main.Session(WordMode.E_to_C, range(100), limit=10)
+        self.assertEqual(len(session), 10)
+        self.assertEqual(session.seek(2).reverse, 0)
+        self.assertEqual(session._count, 3)
+        words = list(session)
+        self.assertEqual(len(words), 10)
+        self.assertEqual(len(set(words)), 10)
+        self.assertTrue(set(words) <= set(range(100)))
+
+    def test_seek_moves_both_ways(self):
+        session = main.Session(WordMode.E_to_C, [5, 6, 7, 8], shuffle=False)
+        self.assertEqual(session.seek(3).word_index, 8)
+        self.assertEqual(session.seek(1).word_index, 6)
+        self.assertEqual(session.peek(2), [6, 7])
+        self.assertEqual(session.position, 1)
+        with self.assertRaises(IndexError):
+            session.seek(4)
+        with self.assertRaises(IndexError):
+            session.seek(-1)
+
+    def test_remove_current(self):
+        session = main.Session(WordMode.E_to_C, [1, 2, 3, 4], shuffle=False)
+        session.seek(1)
+        self.assertEqual(session.remove_current().word_index, 2)
+        self.assertEqual((session.position, session.current.word_index), (1, 3))
+        self.assertEqual(len(session), 3)
+        session.seek(2)
+        self.assertEqual(session.remove_current().word_index, 4)
+        self.assertEqual((session.position, session.current.word_index), (1, 3))
+        session.seek(0)
+        session.remove_current()
+        session.remove_current()
+        self.assertEqual(len(session), 0)
+        self.assertEqual(list(session), [])
+        with self.assertRaises(IndexError):
+            session.remove_current()
+
+    def test_remove_before_next_card_is_drawn(self):
+        session = main.Session(WordMode.E_to_C, [1, 2, 3], shuffle=False)
+        session.seek(0)
+        session.remove_current()
+        self.assertEqual((session.position, session.current.word_index), (0, 2))
+        self.assertEqual(list(session), [2, 3])
+
+    def test_extend(self):
+        session = main.Session(WordMode.E_to_C, [1, 2, 3, 4, 5], limit=2, shuffle=False)
+        session.extend([9], count=1)
+        self.assertEqual(len(session), 4)
+        self.assertEqual(list(session.word_indices()), [1, 2, 3, 4, 5, 9])
+        self.assertEqual(list(session), [1, 2, 3, 9])
+        session.extend(count=10)
+        self.assertEqual(list(session), [1, 2, 3, 9, 4, 5])
+
+    def test_word_mode_sets_reverse(self):
+        session = main.Session(WordMode.C_to_E, [1, 2])
+        self.assertEqual([session.seek(i).reverse for i in range(2)], [1, 1])
+        session = main.Session(WordMode.Mixed_Mode, [1, 2], shuffle=False, reverse_of={1: 1, 2: 0})
+        self.assertEqual([session.seek(i).reverse for i in range(2)], [1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,252 @@
+import datetime
+import os
+import shutil
+from array import array
+import tempfile
+import unittest
+from unittest import mock
+
+import record
+from record import RecordType
+
+
+# 在临时目录中运行，不会读写程序目录下的 records.json 等数据文件
+class RecordTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.json_path = self.file('records.json')
+        with open(self.json_path, 'w') as file:
+            file.write('{}')
+        # 日志/二进制/SQLite 存储第一次创建时会从 path.record_json 导入数据，这里指向临时文件
+        patcher = mock.patch.object(record.path, 'record_json', self.json_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 临时文件在测试结束时删除，不要在程序退出时再写盘
+        patcher = mock.patch.object(record.atexit, 'register')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def file(self, name: str):
+        return os.path.join(self.directory, name)
+
+    def open_storage(self, storage_class, name: str):
+        storage = storage_class(self.file(name))
+        self.addCleanup(storage.close)
+        return storage
+
+
+# 对四种存储引擎执行同一组操作，读取结果必须完全一致
+class BackendEquivalenceTest(RecordTestCase):
+    files = {
+        record.RecordJson: 'records.json',
+        record.RecordJournal: 'records.journal',
+        record.RecordBinary: 'records.bin',
+        record.RecordSqlite: 'records.db',
+    }
+
+    @staticmethod
+    def apply(storage):
+        storage.write_data(RecordType.Logbook, {"2024-01-01": [1, 2, 3], "2024-01-03": [4]})
+        storage.write_day(RecordType.Logbook, "2024-01-02", [5, 6])
+        storage.append(RecordType.Logbook, "2024-01-02", 7)
+        storage.append(RecordType.Logbook, "2024-01-05", 8)
+        storage.write_day(RecordType.LearnedAlready, "2024-01-02", [9, 1])
+        storage.append(RecordType.FullyMastered, "2024-01-04", 2)
+        storage.write_day(RecordType.TodayData, "2024-01-05", [10, 11, 12])
+        storage.write_day(RecordType.TodayData, "2024-01-05", [12, 13])
+
+    @staticmethod
+    def snapshot(storage):
+        _return = {}
+        for data_type in record.record_type_list:
+            _return[data_type] = {
+                "all": {k: list(v) for k, v in (storage.read_data_by_type(data_type) or {}).items()},
+                "day": storage.read_day(data_type, "2024-01-02"),
+                "missing": storage.read_day(data_type, "2023-12-31"),
+                "range": storage.read_range(data_type),
+                "window": storage.read_range(data_type, "2024-01-02", "2024-01-04"),
+                "limit": storage.read_range(data_type, limit=3),
+            }
+        return _return
+
+    def test_backends_agree(self):
+        results = {}
+        for storage_class, name in self.files.items():
+            storage = self.open_storage(storage_class, name)
+            self.apply(storage)
+            results[storage_class.__name__] = self.snapshot(storage)
+        expected = results.pop("RecordJson")
+        self.assertEqual(expected[RecordType.Logbook]["range"], [8, 4, 5, 6, 7, 1, 2, 3])
+        self.assertEqual(expected[RecordType.Logbook]["limit"], [8, 4, 5])
+        self.assertEqual(expected[RecordType.TodayData]["day"], [])
+        for name, result in results.items():
+            with self.subTest(backend=name):
+                self.assertEqual(result, expected)
+
+    def test_backends_persist(self):
+        for storage_class, name in self.files.items():
+            with self.subTest(backend=storage_class.__name__):
+                storage = storage_class(self.file(name))
+                self.apply(storage)
+                expected = self.snapshot(storage)
+                storage.close()
+                reopened = self.open_storage(storage_class, name)
+                self.assertEqual(self.snapshot(reopened), expected)
+
+    def test_sqlite_migrates_json(self):
+        source = record.RecordJson(self.json_path)
+        self.apply(source)
+        source.flush()
+        storage = self.open_storage(record.RecordSqlite, 'records.db')
+        self.assertEqual(self.snapshot(storage), self.snapshot(source))
+
+
+# 日志存储：写了一半的尾行、压缩，以及两个实例（相当于两个进程）共用同一份日志
+class JournalTest(RecordTestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal_path = self.file('records.journal')
+
+    def test_torn_tail_is_truncated(self):
+        storage = record.RecordJournal(self.journal_path)
+        storage.write_day(RecordType.Logbook, "2024-01-01", [1, 2])
+        storage.append(RecordType.Logbook, "2024-01-01", 3)
+        storage.close()
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"append","type":"Logbook","da')
+        storage = self.open_storage(record.RecordJournal, 'records.journal')
+        self.assertEqual(storage.read_day(RecordType.Logbook, "2024-01-01"), [1, 2, 3])
+        with open(self.journal_path, 'rb') as file:
+            self.assertTrue(file.read().endswith(b'}\n'))
+        storage.append(RecordType.Logbook, "2024-01-01", 4)
+        storage.close()
+        reopened = self.open_storage(record.RecordJournal, 'records.journal')
+        self.assertEqual(reopened.read_day(RecordType.Logbook, "2024-01-01"), [1, 2, 3, 4])
+
+    def test_compact_moves_operations_into_snapshot(self):
+        storage = self.open_storage(record.RecordJournal, 'records.journal')
+        for word_index in range(5):
+            storage.append(RecordType.Logbook, "2024-01-01", word_index)
+        storage.compact()
+        self.assertTrue(os.path.exists(storage.snapshot_path))
+        self.assertEqual(os.path.getsize(self.journal_path), 0)
+        storage.append(RecordType.Logbook, "2024-01-02", 5)
+        storage.close()
+        reopened = self.open_storage(record.RecordJournal, 'records.journal')
+        self.assertEqual(reopened.read_range(RecordType.Logbook), [5, 0, 1, 2, 3, 4])
+
+    def test_instances_see_each_other(self):
+        first = self.open_storage(record.RecordJournal, 'records.journal')
+        second = self.open_storage(record.RecordJournal, 'records.journal')
+        first.append(RecordType.Logbook, "2024-01-01", 1)
+        second.append(RecordType.Logbook, "2024-01-01", 2)
+        self.assertEqual(first.read_day(RecordType.Logbook, "2024-01-01"), [1, 2])
+        first.compact()
+        second.append(RecordType.Logbook, "2024-01-01", 3)
+        second.compact()
+        first.append(RecordType.Logbook, "2024-01-01", 4)
+        self.assertEqual(second.read_day(RecordType.Logbook, "2024-01-01"), [1, 2, 3, 4])
+        first.close()
+        second.close()
+        reopened = self.open_storage(record.RecordJournal, 'records.journal')
+        self.assertEqual(reopened.read_day(RecordType.Logbook, "2024-01-01"), [1, 2, 3, 4])
+
+    def test_close_stops_compactor(self):
+        storage = record.RecordJournal(self.journal_path)
+        storage.append(RecordType.Logbook, "2024-01-01", 1)
+        compactor = storage._compactor
+        self.assertTrue(compactor.is_alive())
+        storage.close()
+        self.assertFalse(compactor.is_alive())
+
+
+# 二进制存储：按天保存紧凑数组，文件被截断或损坏时报 EOFError
+class BinaryTest(RecordTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bin_path = self.file('records.bin')
+        storage = record.RecordBinary(self.bin_path)
+        storage.write_data(RecordType.Logbook, {"2024-01-01": [1, 2, 3], "2024-01-02": [70000]})
+        storage.write_day(RecordType.TodayData, "2024-01-02", [4, 5])
+        storage.close()
+
+    def test_round_trip(self):
+        storage = self.open_storage(record.RecordBinary, 'records.bin')
+        self.assertEqual(storage.read_all(), {RecordType.Logbook: {"2024-01-01": [1, 2, 3], "2024-01-02": [70000]},
+                                              RecordType.TodayData: {"2024-01-02": [4, 5]}})
+        with storage.reading():
+            days = storage.read_data_by_type(RecordType.Logbook)
+            self.assertIsInstance(days["2024-01-01"], array)
+            self.assertEqual(days["2024-01-01"].typecode, record.WORD_ARRAY_TYPE)
+
+    def test_imports_json_when_missing(self):
+        with open(self.json_path, 'w') as file:
+            file.write('{"Logbook": {"2024-01-01": [7, 8]}}')
+        storage = self.open_storage(record.RecordBinary, 'new.bin')
+        self.assertEqual(storage.read_day(RecordType.Logbook, "2024-01-01"), [7, 8])
+
+    def test_truncated_file_raises_eof(self):
+        with open(self.bin_path, 'rb') as file:
+            content = file.read()
+        for length in range(len(content)):
+            with self.subTest(length=length):
+                with open(self.bin_path, 'wb') as file:
+                    file.write(content[:length])
+                with self.assertRaises(EOFError):
+                    record.RecordBinary(self.bin_path).read_all()
+
+    def test_foreign_file_raises_eof(self):
+        with open(self.bin_path, 'wb') as file:
+            file.write(b'{"Logbook": {}}')
+        with self.assertRaises(EOFError):
+            record.RecordBinary(self.bin_path).read_all()
+
+
+# 未学习单词池：交换删除、放回，以及通过 Record 的修改增量维护
+class UnlearnedPoolTest(RecordTestCase):
+    def test_discard_and_add(self):
+        pool = record.UnlearnedPool(10, [0, 5])
+        self.assertEqual(len(pool), 8)
+        self.assertNotIn(5, pool)
+        pool.discard(3)
+        pool.discard(3)
+        pool.discard(9)
+        self.assertEqual(sorted(pool.sample(10)), [1, 2, 4, 6, 7, 8])
+        pool.add(3)
+        pool.add(3)
+        pool.add(10)
+        self.assertEqual(sorted(pool.sample(10)), [1, 2, 3, 4, 6, 7, 8])
+
+    def test_sample_is_distinct_and_bounded(self):
+        pool = record.UnlearnedPool(50, range(0, 50, 2))
+        for k in (0, 1, 10, 25, 40):
+            with self.subTest(k=k):
+                sample = pool.sample(k)
+                self.assertEqual(len(sample), min(k, 25))
+                self.assertEqual(len(set(sample)), len(sample))
+                self.assertTrue(all(word_index % 2 for word_index in sample))
+        self.assertEqual(len(pool), 25)
+        self.assertEqual(record.UnlearnedPool(3, [0, 1, 2]).sample(5), [])
+
+    def test_pool_follows_record_changes(self):
+        patcher = mock.patch.object(record.RecordJson, 'default_path', self.json_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        recorder = record.Record(record.RecordBackend.Json)
+        storage = recorder.record_manager
+        self.addCleanup(record.RecordStorage._shared_instances.pop, (record.RecordJson, storage.file_path))
+        self.addCleanup(storage.close)
+        day = datetime.date(2024, 1, 1)
+        recorder.write(RecordType.LearnedAlready, day, [0, 1, 2])
+        recorder.add(RecordType.FullyMastered, day, 3)
+        recorder.add(RecordType.Logbook, day, 4)
+        self.assertEqual(sorted(recorder.sample_unlearned(10, 6)), [4, 5])
+        recorder.add(RecordType.LearnedAlready, day, 5)
+        self.assertEqual(recorder.sample_unlearned(10, 6), [4])
+        recorder.write(RecordType.LearnedAlready, day, [0, 2, 5])
+        self.assertEqual(sorted(recorder.sample_unlearned(10, 6)), [1, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
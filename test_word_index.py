@@ -0,0 +1,82 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import take_data
+import word_index
+
+
+class MappedWordDictionaryTest(unittest.TestCase):
+    words = ["apple", "Apple", "banana", "café", "US", "us", "Zebra"]
+    dict_data = {
+        "apple": {"mean_cn": "苹果", "phonetic": "ˈæpl"},
+        "Apple": {"mean_cn": "苹果公司"},
+        "banana": {"mean_cn": "香蕉", "phonetic": "bəˈnɑːnə"},
+        "café": {"mean_cn": "咖啡馆", "phonetic": ""},
+        "US": {"mean_cn": "美国"},
+        "us": {"mean_cn": "我们"},
+        "Zebra": {"mean_cn": "斑马"},
+    }
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.pickle_path = os.path.join(self.directory, 'word_index_v2.pkl')
+        self.mwd_path = os.path.join(self.directory, 'word_index.mwd')
+        with open(self.pickle_path, 'wb') as f:
+            pickle.dump({"dict_data": self.dict_data, "index_list": self.words}, f)
+        word_index.convert_pickle(self.pickle_path, self.mwd_path)
+        self.mapped = word_index.MappedWordDictionary(self.mwd_path)
+        self.addCleanup(self.mapped.close)
+
+    def test_matches_pickle_dictionary(self):
+        original = take_data.WordDictionary(self.pickle_path)
+        self.assertEqual(len(self.mapped), len(original))
+        self.assertTrue(self.mapped.verify())
+        for index in range(-1, len(self.words) + 1):
+            with self.subTest(index=index):
+                expected = original.get_data_by_index(index)
+                actual = self.mapped.get_data_by_index(index)
+                if expected is None:
+                    self.assertIsNone(actual)
+                else:
+                    # 映射格式的词条总是带有 "word" 字段
+                    self.assertEqual((actual[0], dict(actual[1])), (expected[0], dict(expected[1], word=expected[0])))
+        for index in range(len(self.words)):
+            for field in ("word", "mean_cn", "phonetic", "unknown"):
+                self.assertEqual(self.mapped.get_field(index, field), original.get_field(index, field))
+
+    def test_word_lookup(self):
+        original = take_data.WordDictionary(self.pickle_path)
+        for word in self.words + ["APPLE", "Banana", "CAFÉ", "Us", "zebra", "pear", ""]:
+            with self.subTest(word=word):
+                self.assertEqual(self.mapped.get_index_by_word(word), original.get_index_by_word(word))
+        self.assertEqual(dict(self.mapped.get_data_by_word("Apple")), dict(self.dict_data["Apple"], word="Apple"))
+        self.assertIsNone(self.mapped.get_data_by_word("pear"))
+
+    def test_checksum_detects_corruption(self):
+        with open(self.mwd_path, 'rb') as f:
+            content = bytearray(f.read())
+        content[-1] ^= 0xFF
+        corrupt_path = os.path.join(self.directory, 'corrupt.mwd')
+        with open(corrupt_path, 'wb') as f:
+            f.write(content)
+        corrupt = word_index.MappedWordDictionary(corrupt_path)
+        self.addCleanup(corrupt.close)
+        self.assertFalse(corrupt.verify())
+
+    def test_rejects_foreign_file(self):
+        with self.assertRaises(EOFError):
+            word_index.MappedWordDictionary(self.pickle_path)
+
+    def test_write_keeps_existing_file_on_error(self):
+        with self.assertRaises(KeyError):
+            word_index.write_index([{"word": "apple"}, {"mean_cn": "没有单词"}], self.mwd_path)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['word_index.mwd', 'word_index_v2.pkl'])
+        self.assertTrue(self.mapped.verify())
+
+
+if __name__ == '__main__':
+    unittest.main()
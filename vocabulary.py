@@ -0,0 +1,178 @@
+"""
+单词表编译程序：把 word.txt 和 word_index_v2.pkl 合并成一个去重后的 vocabulary.mwd
+
+1. 单词编号（即记录中保存的单词索引）一经分配就不再改变：第一次编译时 pickle 中的单词沿用原来的位置，
+   word.txt 中 pickle 没有的单词按出现顺序依次追加；以后再编译时已有单词保持原编号，新单词追加在末尾，
+   从来源中删除的单词也保留编号
+2. 同一个单词只保留一条，pickle 中的字段优先，word.txt 的释义只用来补全缺少 mean_cn 的词条
+3. 输出采用 word_index.py 中的内存映射格式，文件头带格式版本、词条个数和校验和，
+   旁边的 vocabulary.mwd.json 记录编译次数、各来源文件的摘要和每个词条的来源；
+   两个文件都以“临时文件 + 重命名”的方式写入，清单在单词表之后写
+4. 再次编译时从上一次的 vocabulary.mwd 读取已有词条，只重新读取摘要发生变化的来源文件
+
+运行 python vocabulary.py 进行编译
+"""
+import hashlib
+import json
+import os
+import pickle
+
+import atomic_file
+import path
+import word_index
+
+
+def file_digest(file_path):
+    """
+    分块计算文件的 sha1 摘要
+    :return: 十六进制摘要字符串
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_word_txt(file_path):
+    """
+    逐行读取 word.txt，每行为 “单词\t释义”
+    :return: 词条字典的生成器
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            word = parts[0].strip()
+            if word:
+                yield {"word": word, "mean_cn": parts[1].strip() if len(parts) > 1 else None}
+
+
+def read_pickle(file_path):
+    """
+    读取旧的 pickle 单词表，按原来的位置顺序输出
+    :return: 词条字典的生成器
+    """
+    with open(file_path, 'rb') as f:
+        data = pickle.load(f)
+    for word in data["index_list"]:
+        entry = dict(data["dict_data"][word])
+        entry["word"] = word
+        yield entry
+
+
+# 来源按优先级排列：前面的来源决定首次编译时的编号顺序，字段冲突时也以前面的为准
+SOURCES = [
+    ("pickle", path.word_index, read_pickle),
+    ("word_txt", path.word_txt, read_word_txt),
+]
+
+
+class VocabularyCompiler:
+    def __init__(self, out_file=path.vocabulary):
+        """
+        :param out_file: 输出的 .mwd 文件，清单文件为同名加 .json
+        """
+        self.out_file = out_file
+        self.manifest_file = out_file + '.json'
+        self.entries = []
+        self.ids = {}
+        self.manifest = {"build": 0, "sources": {}}
+        self.rank = {name: rank for rank, (name, _, _) in enumerate(SOURCES)}
+
+    def load_previous(self):
+        """
+        读取上一次的编译结果和清单，没有或校验失败时从头编译
+        :return: 是否成功读取
+        """
+        if not (os.path.exists(self.out_file) and os.path.exists(self.manifest_file)):
+            return False
+        previous = word_index.MappedWordDictionary(self.out_file)
+        if not previous.verify():
+            return False
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        # 每个词条的来源在清单中保存为一串来源序号；旧版本的单词表把来源写在词条的 "source" 字段中
+        ranks = self.manifest.get("entry_sources", "")
+        for index in range(len(previous)):
+            entry = dict(previous.get_data_by_index(index)[1])
+            source = entry.pop("source", None)
+            if index < len(ranks):
+                source = SOURCES[int(ranks[index])][0]
+            if source is not None:
+                entry["source"] = source
+            self.ids[entry["word"]] = index
+            self.entries.append(entry)
+        previous.close()
+        return True
+
+    def merge(self, entry, source):
+        """
+        把来源中的一个词条并入结果，新单词分配下一个编号；已有单词由优先级不低于原来源的来源覆盖字段，
+        优先级更低的来源只补全缺少的字段。词条的 "source" 字段记录提供它的最高优先级来源，只在编译过程中使用，
+        写入单词表前去掉
+        :param entry: 词条字典
+        :param source: 来源名称
+        """
+        rank = self.rank[source]
+        word = entry["word"]
+        index = self.ids.get(word)
+        if index is None:
+            self.ids[word] = len(self.entries)
+            self.entries.append({k: v for k, v in entry.items() if v is not None})
+            self.entries[-1]["source"] = source
+            return
+        current = self.entries[index]
+        current_rank = self.rank.get(current.get("source"), len(SOURCES))
+        for field, value in entry.items():
+            if value is not None and (field not in current or rank <= current_rank):
+                current[field] = value
+        if rank < current_rank:
+            current["source"] = source
+
+    def compile(self):
+        """
+        执行一次编译
+        :return: 本次重新读取的来源名称列表
+        """
+        self.load_previous()
+        changed = []
+        digests = {}
+        for name, source_file, reader in SOURCES:
+            if not os.path.exists(source_file):
+                continue
+            digests[name] = file_digest(source_file)
+            if self.manifest["sources"].get(name) == digests[name]:
+                continue
+            changed.append(name)
+            for entry in reader(source_file):
+                self.merge(entry, name)
+        if not changed and os.path.exists(self.out_file):
+            return changed
+
+        content = word_index.encode_index([{k: v for k, v in entry.items() if k != "source"}
+                                           for entry in self.entries])
+        temp_path = atomic_file.write_temp(content, self.out_file)
+        written = word_index.MappedWordDictionary(temp_path)
+        valid = written.verify()
+        written.close()
+        if not valid:
+            os.remove(temp_path)
+            raise EOFError(f"生成的单词表 {temp_path} 校验失败")
+        atomic_file.replace(temp_path, self.out_file)
+
+        self.manifest["build"] += 1
+        self.manifest["count"] = len(self.entries)
+        self.manifest["sources"].update(digests)
+        self.manifest["entry_sources"] = ''.join(str(self.rank[entry["source"]]) for entry in self.entries)
+        atomic_file.write(json.dumps(self.manifest, indent=4), self.manifest_file)
+        return changed
+
+
+if __name__ == "__main__":
+    compiler = VocabularyCompiler()
+    reread = compiler.compile()
+    if reread:
+        print(f"第 {compiler.manifest['build']} 次编译完成，重新读取了 {', '.join(reread)}，"
+              f"共 {len(compiler.entries)} 个单词 -> {compiler.out_file}")
+    else:
+        print("来源文件没有变化，无需重新编译")
@@ -0,0 +1,214 @@
+"""
+单词表的内存映射格式（.mwd）
+
+文件结构（全部为小端字节序）：
+1. 文件头：魔数 b'MWDX'、格式版本、字段个数、词条个数、校验和（文件头之后全部内容的 crc32）
+2. 字段名表：每个字段名为 u16 长度 + UTF-8 字节，第一个字段固定为 "word"
+3. 偏移表：词条个数 × 字段个数 个 (u32 偏移, u32 长度)，定长，按位置直接定位；长度为 0xFFFFFFFF 表示该词条没有此字段
+4. 查找表：词条个数 个 u32 位置，按单词小写形式排序，用于二分查找单词
+5. 字符串区：所有字段值的 UTF-8 字节依次拼接
+
+打开时只读取文件头和字段名，其余内容通过 mmap 按需访问，词条的每个字段在被访问时才解码。
+运行 python word_index.py 可以把 word_index_v2.pkl 转换为 word_index.mwd
+"""
+import mmap
+import pickle
+import struct
+import zlib
+from collections.abc import Mapping
+
+import atomic_file
+import path
+
+MAGIC = b'MWDX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+SLOT = struct.Struct('<II')
+POSITION = struct.Struct('<I')
+MISSING = 0xFFFFFFFF
+
+
+class MappedEntry(Mapping):
+    """一个词条的只读视图，字段在被访问时才从映射的文件中解码"""
+
+    def __init__(self, dictionary, index):
+        self._dictionary = dictionary
+        self._index = index
+
+    def __getitem__(self, field):
+        value = self._dictionary.get_field(self._index, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        for field in self._dictionary.fields:
+            if self._dictionary.get_field(self._index, field) is not None:
+                yield field
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class MappedWordDictionary:
+    def __init__(self, index_file):
+        """
+        以只读方式映射单词表文件，接口与 take_data.WordDictionary 相同
+        :param index_file: .mwd 文件路径
+        """
+        with open(index_file, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, field_count, self._count, self.checksum = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise EOFError(f"文件 {index_file} 不是可识别的单词表文件")
+        position = HEADER.size
+        self.fields = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from('<H', self._mmap, position)
+            position += 2
+            self.fields.append(self._mmap[position:position + length].decode('utf-8'))
+            position += length
+        self._field_number = {field: i for i, field in enumerate(self.fields)}
+        self._slot_start = position
+        self._lookup_start = self._slot_start + self._count * field_count * SLOT.size
+        self._blob_start = self._lookup_start + self._count * POSITION.size
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._mmap.close()
+
+    def verify(self):
+        """
+        校验文件头之后全部内容的 crc32
+        :return: 校验是否通过
+        """
+        return zlib.crc32(memoryview(self._mmap)[HEADER.size:]) == self.checksum
+
+    def get_field(self, index, field):
+        """
+        解码指定词条的一个字段
+        :return: 字段值字符串，词条没有该字段时返回None
+        """
+        field_number = self._field_number.get(field)
+        if field_number is None:
+            return None
+        offset, length = SLOT.unpack_from(
+            self._mmap, self._slot_start + (index * len(self.fields) + field_number) * SLOT.size)
+        if length == MISSING:
+            return None
+        start = self._blob_start + offset
+        return self._mmap[start:start + length].decode('utf-8')
+
+    def get_word(self, index):
+        return self.get_field(index, 'word')
+
+    def get_data_by_index(self, index):
+        """
+        通过数字索引获取数据
+        :param index: 数字位置 (0-based)
+        :return: (单词, 数据) 或 None
+        """
+        if 0 <= index < self._count:
+            return self.get_word(index), MappedEntry(self, index)
+        return None
+
+    def get_data_by_word(self, word):
+        """
+        通过单词获取数据 (兼容大小写)
+        :return: 数据 或 None
+        """
+        index = self.get_index_by_word(word)[0]
+        return None if index == -1 else MappedEntry(self, index)
+
+    def get_index_by_word(self, word):
+        """
+        在按小写形式排序的查找表上二分查找，完全相同的单词优先，其次是等于其小写形式的单词，
+        最后是小写形式相同的第一个单词
+        :return: (索引位置, 总词数) 或 (-1, 总词数)
+        """
+        target = word.lower()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_word(self._lookup(middle)).lower() < target:
+                low = middle + 1
+            else:
+                high = middle
+        best, best_rank = -1, 3
+        while low < self._count:
+            index = self._lookup(low)
+            candidate = self.get_word(index)
+            if candidate.lower() != target:
+                break
+            rank = 0 if candidate == word else 1 if candidate == target else 2
+            if rank < best_rank:
+                best, best_rank = index, rank
+            low += 1
+        return best, self._count
+
+    def _lookup(self, rank):
+        return POSITION.unpack_from(self._mmap, self._lookup_start + rank * POSITION.size)[0]
+
+
+def encode_index(entries):
+    """
+    把词条编码为 .mwd 文件内容
+    :param entries: 按位置排列的词条字典列表，每个词条必须有 "word" 字段
+    :return: bytes
+    """
+    fields = ['word']
+    for entry in entries:
+        for field in entry:
+            if field not in fields:
+                fields.append(field)
+
+    slots = bytearray()
+    blob = bytearray()
+    for entry in entries:
+        for field in fields:
+            value = entry.get(field)
+            if value is None:
+                slots += SLOT.pack(0, MISSING)
+            else:
+                encoded = str(value).encode('utf-8')
+                slots += SLOT.pack(len(blob), len(encoded))
+                blob += encoded
+
+    order = sorted(range(len(entries)), key=lambda i: (entries[i]['word'].lower(), i))
+    lookup = b''.join(POSITION.pack(i) for i in order)
+    names = b''.join(struct.pack('<H', len(field.encode('utf-8'))) + field.encode('utf-8') for field in fields)
+    body = names + bytes(slots) + lookup + bytes(blob)
+    return HEADER.pack(MAGIC, VERSION, len(fields), len(entries), zlib.crc32(body)) + body
+
+
+def write_index(entries, out_file):
+    """
+    把词条写成 .mwd 文件，以“临时文件 + 重命名”的方式替换，转换中断时不会留下不完整的文件
+    :param entries: 按位置排列的词条字典列表，每个词条必须有 "word" 字段
+    :param out_file: 输出文件路径
+    """
+    atomic_file.write(encode_index(entries), out_file)
+
+
+def convert_pickle(pickle_file, out_file):
+    """
+    把旧的 pickle 单词表转换为 .mwd 文件，单词位置保持不变
+    :param pickle_file: word_index_v2.pkl 路径
+    :param out_file: 输出文件路径
+    """
+    with open(pickle_file, 'rb') as f:
+        data = pickle.load(f)
+    entries = []
+    for word in data["index_list"]:
+        entry = dict(data["dict_data"][word])
+        entry["word"] = word
+        entries.append(entry)
+    write_index(entries, out_file)
+
+
+if __name__ == "__main__":
+    convert_pickle(path.word_index, path.word_index_mmap)
+    converted = MappedWordDictionary(path.word_index_mmap)
+    print(f"已转换 {len(converted)} 个词条到 {path.word_index_mmap}，校验{'通过' if converted.verify() else '失败'}")